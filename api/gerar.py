@@ -5,105 +5,1163 @@ Rotas:
   POST /api/chat     → simulador de entrevista (pergunta por pergunta)
   POST /api/feedback → feedback final da entrevista
   POST /api/chance   → ranking de chance por vaga
+  POST /api/chance/lote → um perfil contra várias vagas, ordenadas por chance
+  POST /api/email    → põe o currículo na fila de envio por email (devolve o id)
+  GET  /api/cache    → contadores do cache de respostas
+  GET  /api/uso      → tokens por rota (inclusive cache de prompt) e tempo no modelo
+  GET  /api/roteamento → modelo/limites por rota e latência recente por modelo
+  GET  /api/email/status?id= → estado do envio (sem id: contagem por estado)
+  GET  /api/metrics  → tempo por fase, tokens e fallbacks por rota (texto do Prometheus)
+
+/api/gerar e /api/chat respondem em Server-Sent Events quando o cliente
+manda Accept: text/event-stream (ou ?stream=1).
 """
-import json, os, urllib.request, unicodedata, urllib.parse
+import json, os, re, sys, math, marshal, html, random, bisect, threading, time, types, urllib.parse, contextlib, http.client, collections, functools
 from http.server import BaseHTTPRequestHandler
 
 # ─── utils ────────────────────────────────────────────────────────────────────
 
 def slug(txt):
-    txt = unicodedata.normalize('NFKD', txt).encode('ascii','ignore').decode('ascii')
+    if not txt.isascii():
+        import unicodedata
+        txt = unicodedata.normalize('NFKD', txt).encode('ascii','ignore').decode('ascii')
     return txt.lower().strip()
 
 def hifenado(txt):
     return slug(txt).replace(' ', '-')
 
+# emoji dos chips de área do site → (área, habilidades típicas em slug)
+AREAS = {
+    '💼': ('Administrativo', ['excel','word','pacote office','planilhas','arquivo','documentos','organizacao',
+                             'rotinas administrativas','agenda','digitacao','relatorios','atendimento telefonico']),
+    '💻': ('Tecnologia',     ['python','javascript','html','css','sql','java','programacao','git','redes',
+                             'suporte tecnico','banco de dados','informatica','excel']),
+    '📊': ('Financeiro',     ['contas a pagar','contas a receber','fluxo de caixa','conciliacao bancaria','excel',
+                             'faturamento','contabilidade','notas fiscais','cobranca','planilhas']),
+    '🎨': ('Design',         ['photoshop','illustrator','figma','canva','corel','design grafico','identidade visual',
+                             'ui','ux','edicao de imagem','criatividade']),
+    '🛒': ('Vendas',         ['vendas','negociacao','metas','prospeccao','crm','pos-venda','varejo','caixa',
+                             'atendimento','comunicacao']),
+    '🤝': ('Atendimento ao Cliente', ['atendimento','sac','telemarketing','recepcao','empatia','comunicacao',
+                             'resolucao de problemas','cordialidade','paciencia']),
+    '📦': ('Logística',      ['estoque','almoxarifado','expedicao','recebimento','inventario','empilhadeira',
+                             'separacao','conferencia','logistica','cnh']),
+    '🏥': ('Saúde',          ['primeiros socorros','enfermagem','farmacia','recepcao','agendamento','prontuario',
+                             'higienizacao','cuidador','auxiliar de saude']),
+    '📣': ('Marketing',      ['redes sociais','instagram','marketing digital','conteudo','copywriting','canva',
+                             'seo','anuncios','trafego pago','comunicacao']),
+    '🔧': ('Outro',          ['manutencao','eletrica','mecanica','ferramentas','proatividade','trabalho em equipe',
+                             'pontualidade']),
+}
+
 def limpar_area(area):
-    for e in ['💼','💻','📊','🎨','🛒','🤝','📦','🏥','📣','🔧']:
-        area = area.replace(e, '')
+    if not area.isascii():
+        for e in AREAS:
+            area = area.replace(e, '')
     return area.split(',')[0].strip()
 
-def chamar_ia(prompt, max_tokens=2000):
+# ─── partida fria ─────────────────────────────────────────────────────────────
+# O import faz só o que o handler precisa: portais, modelos HTML e tabelas da pré-avaliação
+# são montados no primeiro uso, as regex são compiladas pelo re quando usadas e hashlib,
+# unicodedata e sqlite3 são importados dentro das funções que os usam.
+# EMPREGAAI_SNAPSHOT (opcional) aponta para um arquivo de bench/partida_fria.py --snapshot
+# com esse trabalho já feito; vale só no mesmo Python e para o que bater com a fonte atual.
+
+COMPILADOS = {}   # fonte da lambda → código
+TABELAS    = {}   # nome → (entrada, tabela)
+
+@functools.lru_cache(maxsize=None)
+def snapshot():
+    """{'codigo': ..., 'tabelas': ...} do arquivo (caminho relativo a api/), ou {} se não houver
+    snapshot, se ele for de outra versão do Python ou não abrir"""
+    caminho = os.environ.get('EMPREGAAI_SNAPSHOT')
+    if not caminho:
+        return {}
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), caminho), 'rb') as f:
+            versao, _, dados = f.read().partition(b'\n')
+        return marshal.loads(dados) if versao.decode() == sys.implementation.cache_tag else {}
+    except (OSError, ValueError, EOFError, UnicodeDecodeError):
+        return {}
+
+def compilar(fonte):
+    """eval de 'lambda ...' gerada por um modelo, ou o código já compilado do snapshot"""
+    codigo = snapshot().get('codigo', {}).get(fonte)
+    fn     = types.FunctionType(codigo, globals()) if codigo else eval(fonte)
+    COMPILADOS[fonte] = fn.__code__
+    return fn
+
+def tabela(nome, entrada, montar):
+    """Tabela derivada de `entrada` (str): a do snapshot se a entrada for a mesma, senão montar()"""
+    salvo = snapshot().get('tabelas', {}).get(nome)
+    valor = salvo[1] if salvo and salvo[0] == entrada else montar()
+    TABELAS[nome] = (entrada, valor)
+    return valor
+
+def gravar_snapshot(caminho):
+    """Monta tudo o que é preguiçoso e grava código e tabelas (marshal, só para este Python)"""
+    montagem_portais(), MODELO_CV.compilado, MODELO_EMAIL.compilado, tabelas_chance()
+    with open(caminho, 'wb') as f:
+        f.write(sys.implementation.cache_tag.encode() + b'\n')
+        marshal.dump({'codigo': COMPILADOS, 'tabelas': TABELAS}, f)
+    return {'lambdas': len(COMPILADOS), 'tabelas': sorted(TABELAS)}
+
+# ─── http ─────────────────────────────────────────────────────────────────────
+
+URLS_BASE = {
+    'anthropic': 'https://api.anthropic.com',
+    'resend':    'https://api.resend.com',
+}
+
+def url_base(servico):
+    """URL do serviço; ANTHROPIC_BASE_URL / RESEND_BASE_URL apontam para um servidor local nos testes"""
+    return os.environ.get(servico.upper()+'_BASE_URL', URLS_BASE[servico]).rstrip('/')
+
+class ErroHTTP(Exception):
+    def __init__(self, status, corpo, headers=None):
+        super().__init__(f'HTTP {status}: {corpo[:300]}')
+        self.status  = status
+        self.corpo   = corpo
+        self.headers = headers or {}
+
+def retry_after(erro):
+    """Segundos do header Retry-After de um ErroHTTP (None se ausente ou em formato de data)"""
+    valor = {k.lower(): v for k, v in erro.headers.items()}.get('retry-after')
+    try:
+        return float(valor) if valor else None
+    except ValueError:
+        return None
+
+class PoolHTTP:
+    """Conexões HTTP(S) persistentes por host, reaproveitadas entre requisições da instância quente"""
+
+    ERROS_CONEXAO_VELHA = (http.client.RemoteDisconnected, http.client.CannotSendRequest,
+                           ConnectionResetError, BrokenPipeError)
+
+    def __init__(self, max_por_host=8, ocioso_max=50.0):
+        self.max_por_host = max_por_host
+        self.ocioso_max   = ocioso_max
+        self._livres      = {}   # (esquema, host, porta) → [(conexão, último uso)]
+        self._abertas     = {}   # (esquema, host, porta) → total de conexões (livres + em uso)
+        self._cond        = threading.Condition()
+
+    def _chave(self, url):
+        u = urllib.parse.urlsplit(url)
+        porta   = u.port or (443 if u.scheme == 'https' else 80)
+        caminho = (u.path or '/') + ('?'+u.query if u.query else '')
+        return (u.scheme, u.hostname, porta), caminho
+
+    def _despejar_ociosas(self, chave):
+        livres = self._livres.get(chave)
+        limite = time.monotonic() - self.ocioso_max
+        while livres and livres[0][1] < limite:
+            conn, _ = livres.pop(0)
+            conn.close()
+            self._abertas[chave] -= 1
+
+    def _pegar(self, chave, timeout, nova=False):
+        """(conexão, reusada?); nova=True descarta as ociosas do host e abre uma conexão nova"""
+        prazo = time.monotonic() + timeout
+        with self._cond:
+            if nova:
+                # uma ociosa veio fechada pelo servidor: as outras são tão velhas quanto ela
+                for conn, _ in self._livres.pop(chave, []):
+                    conn.close()
+                    self._abertas[chave] -= 1
+            while True:
+                self._despejar_ociosas(chave)
+                livres = self._livres.get(chave)
+                if livres:
+                    conn, _ = livres.pop()
+                    conn.timeout = timeout
+                    if conn.sock: conn.sock.settimeout(timeout)
+                    return conn, True
+                if self._abertas.get(chave, 0) < self.max_por_host:
+                    self._abertas[chave] = self._abertas.get(chave, 0) + 1
+                    break
+                resta = prazo - time.monotonic()
+                if resta <= 0:
+                    raise TimeoutError(f'pool HTTP esgotado para {chave[1]}')
+                self._cond.wait(resta)
+        esquema, host, porta = chave
+        cls = http.client.HTTPSConnection if esquema == 'https' else http.client.HTTPConnection
+        return cls(host, porta, timeout=timeout), False
+
+    def _devolver(self, chave, conn, reutilizar):
+        with self._cond:
+            if reutilizar:
+                self._livres.setdefault(chave, []).append((conn, time.monotonic()))
+            else:
+                conn.close()
+                self._abertas[chave] -= 1
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def abrir(self, metodo, url, corpo=None, headers=None, timeout=30):
+        """Resposta aberta para leitura incremental; a conexão volta ao pool se for lida até o fim"""
+        chave, caminho = self._chave(url)
+        for tentativa in (0, 1):
+            conn, reusada = self._pegar(chave, timeout, nova=tentativa > 0)
+            try:
+                conn.request(metodo, caminho, body=corpo, headers=headers or {})
+                resp = conn.getresponse()
+                break
+            except self.ERROS_CONEXAO_VELHA:
+                self._devolver(chave, conn, False)
+                if not (reusada and tentativa == 0): raise
+                # servidor fechou a conexão ociosa — tenta de novo numa conexão nova, não na próxima da fila
+            except BaseException:
+                self._devolver(chave, conn, False)
+                raise
+        lida = False
+        try:
+            yield resp
+            lida = resp.isclosed()
+        finally:
+            self._devolver(chave, conn, lida)
+
+    def requisitar(self, metodo, url, corpo=None, headers=None, timeout=30):
+        """Devolve (status, headers, corpo em bytes)"""
+        with self.abrir(metodo, url, corpo, headers, timeout) as r:
+            return r.status, dict(r.getheaders()), r.read()
+
+    def fechar(self):
+        with self._cond:
+            for chave, livres in self._livres.items():
+                for conn, _ in livres: conn.close()
+                self._abertas[chave] -= len(livres)
+            self._livres.clear()
+
+POOL = PoolHTTP(max_por_host=int(os.environ.get('EMPREGAAI_POOL_POR_HOST', 8)))
+
+def post_json(url, dados, headers, timeout):
+    """POST JSON pelo pool; status ≥ 400 vira ErroHTTP"""
+    corpo = json.dumps(dados).encode('utf-8')
+    hdrs  = dict(headers, **{'Content-Type': 'application/json'})
+    status, resp_headers, resp = POOL.requisitar('POST', url, corpo, hdrs, timeout)
+    if status >= 400:
+        raise ErroHTTP(status, resp.decode('utf-8', 'replace'), resp_headers)
+    return json.loads(resp.decode())
+
+# ─── ia ───────────────────────────────────────────────────────────────────────
+
+MODELO        = 'claude-sonnet-4-20250514'
+MODELO_RAPIDO = 'claude-3-5-haiku-20241022'
+
+# ─── roteamento de modelos ────────────────────────────────────────────────────
+
+# por rota: modelo, max_tokens, timeout (s — prazo total da chamada, fila do limitador incluída), temperatura (None = padrão da API) e, para o
+# rebaixamento automático, o p95 máximo (ms) antes de trocar para `modelo_rapido`.
+# EMPREGAAI_ROTEAMENTO='{"/api/chat": {"modelo": "..."}}' sobrescreve campos.
+ROTEAMENTO_PADRAO = {'modelo': MODELO, 'max_tokens': 2000, 'timeout': 45, 'temperatura': None,
+                     'modelo_rapido': None, 'p95_max': None}
+ROTEAMENTO = {
+    '/api/gerar':    {'max_tokens': 4000, 'timeout': 45},
+    '/api/chat':     {'max_tokens': 300,  'timeout': 10, 'modelo_rapido': MODELO_RAPIDO, 'p95_max': 6000},
+    '/api/feedback': {'max_tokens': 600,  'timeout': 30, 'modelo_rapido': MODELO_RAPIDO, 'p95_max': 15000},
+    '/api/chance':   {'max_tokens': 500,  'timeout': 30, 'modelo_rapido': MODELO_RAPIDO, 'p95_max': 12000},
+    '/api/chance/lote': {'max_tokens': 2500, 'timeout': 40},
+}
+for _rota, _campos in json.loads(os.environ.get('EMPREGAAI_ROTEAMENTO') or '{}').items():
+    ROTEAMENTO.setdefault(_rota, {}).update(_campos)
+
+class LatenciasModelo:
+    """Latências recentes por (modelo, rota) numa janela de tempo; amostras velhas saem
+    sozinhas, então um modelo rebaixado volta a ser tentado quando a janela esvazia"""
+
+    def __init__(self, janela=300, max_amostras=200):
+        self.janela       = janela
+        self.max_amostras = max_amostras
+        self._amostras    = {}   # (modelo, rota) → deque[(instante, ms)]
+        self._lock        = threading.Lock()
+
+    def registrar(self, modelo, rota, ms):
+        with self._lock:
+            fila = self._amostras.setdefault((modelo, rota), collections.deque(maxlen=self.max_amostras))
+            fila.append((time.monotonic(), ms))
+
+    def _recentes(self, modelo, rota):
+        fila   = self._amostras.get((modelo, rota), ())
+        limite = time.monotonic() - self.janela
+        while fila and fila[0][0] < limite:
+            fila.popleft()
+        return sorted(ms for _, ms in fila)
+
+    def percentil(self, modelo, rota, p, min_amostras=1):
+        with self._lock:
+            ms = self._recentes(modelo, rota)
+        return ms[min(len(ms) - 1, int(len(ms) * p))] if len(ms) >= max(1, min_amostras) else None
+
+    def resumo(self):
+        with self._lock:
+            chaves = list(self._amostras)
+        return [{'modelo': m, 'rota': r, 'amostras': len(self._amostras[(m, r)]),
+                 'p50_ms': self.percentil(m, r, .50), 'p95_ms': self.percentil(m, r, .95)} for m, r in chaves]
+
+LATENCIAS = LatenciasModelo()
+
+def config_ia(rota, ajustes=None, max_tokens=None, timeout=None):
+    """Configuração efetiva da chamada: tabela da rota + valores explícitos do código +
+    ajustes do corpo da requisição (`ia`), limitados ao que a rota permite"""
+    base = dict(ROTEAMENTO_PADRAO, **ROTEAMENTO.get(rota, {}))
+    if max_tokens is not None: base['max_tokens'] = max_tokens
+    if timeout    is not None: base['timeout']    = timeout
+    cfg = dict(base)
+    if ajustes:
+        m = ajustes.get('modelo')
+        if m and m in (base['modelo'], base['modelo_rapido']):
+            cfg['modelo'] = m
+        if isinstance(ajustes.get('max_tokens'), int):
+            cfg['max_tokens'] = max(1, min(ajustes['max_tokens'], base['max_tokens']))
+        if isinstance(ajustes.get('temperatura'), (int, float)):
+            cfg['temperatura'] = max(0.0, min(float(ajustes['temperatura']), 1.0))
+        if isinstance(ajustes.get('timeout'), (int, float)):
+            cfg['timeout'] = max(1, min(ajustes['timeout'], base['timeout']))
+    if cfg['modelo'] == base['modelo'] and base['modelo_rapido'] and base['p95_max']:
+        p95 = LATENCIAS.percentil(base['modelo'], rota, .95, min_amostras=5)
+        if p95 is not None and p95 > base['p95_max']:
+            cfg['modelo'] = base['modelo_rapido']
+    return cfg
+
+def estatisticas_roteamento():
+    return dict({'rotas': {rota: dict(ROTEAMENTO_PADRAO, **campos) for rota, campos in ROTEAMENTO.items()},
+                 'modelo_atual': {rota: config_ia(rota)['modelo'] for rota in ROTEAMENTO},
+                 'latencias': LATENCIAS.resumo()}, **estatisticas_protecao())
+
+# ─── métricas ─────────────────────────────────────────────────────────────────
+
+class Histograma:
+    """Contagens em faixas fixas de ms (o histogram do Prometheus); p50/p95/p99 saem por
+    interpolação dentro da faixa, sem guardar amostras"""
+    LIMITES = (.05, .1, .25, .5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 45000, 90000)
+    __slots__ = ('contagens', 'soma', 'total')
+
+    def __init__(self):
+        self.contagens = [0] * (len(self.LIMITES) + 1)     # a última faixa é +Inf
+        self.soma      = 0.0
+        self.total     = 0
+
+    def registrar(self, ms):
+        self.contagens[bisect.bisect_left(self.LIMITES, ms)] += 1
+        self.soma  += ms
+        self.total += 1
+
+    def percentil(self, p):
+        alvo, acum = p * self.total, 0
+        for i, n in enumerate(self.contagens):
+            if n and acum + n >= alvo:
+                if i == len(self.LIMITES):
+                    return float(self.LIMITES[-1])
+                baixo = self.LIMITES[i-1] if i else 0.0
+                return baixo + (self.LIMITES[i] - baixo) * (alvo - acum) / n
+            acum += n
+        return None
+
+class Metricas:
+    """Tempo por fase de cada rota (parse, prompt, upstream, json, serializacao, total),
+    contadores de requisições/fallbacks e perfis cProfile amostrados. A rota da requisição
+    fica na thread (requisicao/na_rota); quem roda fora dela passa a rota explícita."""
+
+    QUANTIS = (.5, .95, .99)
+
+    def __init__(self):
+        self._hist     = {}                        # (rota, fase) → Histograma
+        self._cont     = collections.Counter()     # (métrica, rota, rótulo) → n
+        self._lock     = threading.Lock()
+        self._local    = threading.local()
+        self.perfis    = collections.deque(maxlen=20)
+        self.amostra   = float(os.environ.get('EMPREGAAI_PERFIL_AMOSTRA', 0))    # fração perfilada
+        self.por_header = os.environ.get('EMPREGAAI_PERFIL_HEADER') == '1'      # aceita X-Perfil: 1
+
+    def registrar(self, rota, fase, ms):
+        with self._lock:
+            h = self._hist.get((rota, fase))
+            if h is None:
+                h = self._hist[(rota, fase)] = Histograma()
+            h.registrar(ms)
+
+    def contar(self, metrica, rota=None, rotulo='', n=1):
+        with self._lock:
+            self._cont[(metrica, rota or self.rota_atual() or '-', rotulo)] += n
+
+    def rota_atual(self):
+        return getattr(self._local, 'rota', None)
+
+    @contextlib.contextmanager
+    def requisicao(self, rota):
+        self._local.rota = rota
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(rota, 'total', (time.perf_counter() - inicio) * 1000)
+            self._local.rota = None
+
+    @contextlib.contextmanager
+    def fase(self, fase, rota=None):
+        rota   = rota or self.rota_atual()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            if rota: self.registrar(rota, fase, (time.perf_counter() - inicio) * 1000)
+
+    def medir(self, fase):
+        """Decorador: cada chamada conta como a fase na rota da requisição"""
+        def decorador(fn):
+            @functools.wraps(fn)
+            def medido(*args, **kwargs):
+                with self.fase(fase):
+                    return fn(*args, **kwargs)
+            return medido
+        return decorador
+
+    def na_rota(self, fn):
+        """fn para o executor, levando a rota da requisição para a thread do pool"""
+        rota = self.rota_atual()
+        def com_rota(*args):
+            self._local.rota = rota
+            try:
+                return fn(*args)
+            finally:
+                self._local.rota = None
+        return com_rota
+
+    # ── cProfile ──
+
+    def perfilar(self, pedido_header):
+        return (self.por_header and pedido_header == '1') or (self.amostra and random.random() < self.amostra)
+
+    @contextlib.contextmanager
+    def perfil(self, rota):
+        """Perfila o bloco; o id (para GET /api/metrics?perfil=) vai em perfil['id']"""
+        import cProfile, pstats, io
+        info = {'id': os.urandom(6).hex(), 'rota': rota}
+        prof = cProfile.Profile()
+        inicio = time.perf_counter()
+        prof.enable()
+        try:
+            yield info
+        finally:
+            prof.disable()
+            saida = io.StringIO()
+            pstats.Stats(prof, stream=saida).sort_stats('cumulative').print_stats(30)
+            info.update(ms=round((time.perf_counter() - inicio) * 1000, 1), texto=saida.getvalue())
+            self.perfis.append(info)
+
+    def texto_perfil(self, pid):
+        if not pid:
+            return ''.join(f"{p['id']} {p['rota']} {p['ms']} ms\n" for p in reversed(self.perfis))
+        return next((p['texto'] for p in self.perfis if p['id'] == pid), f'perfil {pid} não encontrado\n')
+
+    # ── exposição ──
+
+    def prometheus(self):
+        """Formato texto do Prometheus (version=0.0.4); tempos em segundos"""
+        with self._lock:
+            hist = {k: (h.contagens[:], h.soma, h.total, [h.percentil(q) for q in self.QUANTIS])
+                    for k, h in self._hist.items()}
+            cont = dict(self._cont)
+        linhas = ['# HELP empregaai_fase_segundos Tempo por fase da requisição',
+                  '# TYPE empregaai_fase_segundos histogram']
+        for (rota, fase), (contagens, soma, total, _) in sorted(hist.items()):
+            rot, acum = f'rota="{rotulo_prom(rota)}",fase="{fase}"', 0
+            for limite, n in zip(Histograma.LIMITES + (None,), contagens):
+                acum += n
+                le = '+Inf' if limite is None else repr(limite / 1000)
+                linhas.append(f'empregaai_fase_segundos_bucket{{{rot},le="{le}"}} {acum}')
+            linhas.append(f'empregaai_fase_segundos_sum{{{rot}}} {soma / 1000:.6f}')
+            linhas.append(f'empregaai_fase_segundos_count{{{rot}}} {total}')
+        linhas += ['# HELP empregaai_fase_quantil_segundos p50/p95/p99 estimados do histograma',
+                   '# TYPE empregaai_fase_quantil_segundos gauge']
+        for (rota, fase), (_, _, _, quantis) in sorted(hist.items()):
+            for q, v in zip(self.QUANTIS, quantis):
+                linhas.append(f'empregaai_fase_quantil_segundos{{rota="{rotulo_prom(rota)}",fase="{fase}",'
+                              f'quantil="{q}"}} {v / 1000:.6f}')
+        por_metrica = collections.defaultdict(list)
+        for (metrica, rota, rotulo), n in sorted(cont.items()):
+            por_metrica[metrica].append((rota, rotulo, n))
+        for metrica, (ajuda, nome_rotulo) in CONTADORES.items():
+            linhas += [f'# HELP empregaai_{metrica}_total {ajuda}', f'# TYPE empregaai_{metrica}_total counter']
+            for rota, rotulo, n in por_metrica.get(metrica, ()):
+                extra = f',{nome_rotulo}="{rotulo_prom(rotulo)}"' if nome_rotulo else ''
+                linhas.append(f'empregaai_{metrica}_total{{rota="{rotulo_prom(rota)}"{extra}}} {n}')
+        linhas += ['# HELP empregaai_tokens_total Tokens do campo usage da API, por tipo',
+                   '# TYPE empregaai_tokens_total counter']
+        uso = estatisticas_uso()
+        for rota, c in sorted(uso.items()):
+            for campo in CAMPOS_USO:
+                linhas.append(f'empregaai_tokens_total{{rota="{rotulo_prom(rota)}",tipo="{campo[:-7]}"}} {c.get(campo, 0)}')
+        linhas += ['# HELP empregaai_chamadas_modelo_total Chamadas concluídas ao modelo',
+                   '# TYPE empregaai_chamadas_modelo_total counter']
+        linhas += [f'empregaai_chamadas_modelo_total{{rota="{rotulo_prom(rota)}"}} {c.get("chamadas", 0)}'
+                   for rota, c in sorted(uso.items())]
+        protecao = estatisticas_protecao()
+        linhas += ['# HELP empregaai_limite_modelo Teto atual (AIMD) de chamadas simultâneas ao modelo',
+                   '# TYPE empregaai_limite_modelo gauge', f"empregaai_limite_modelo {protecao['limitador']['limite']}",
+                   '# HELP empregaai_em_voo_modelo Chamadas ao modelo em andamento',
+                   '# TYPE empregaai_em_voo_modelo gauge', f"empregaai_em_voo_modelo {protecao['limitador']['em_voo']}",
+                   '# HELP empregaai_disjuntor_aberto 1 com o disjuntor aberto ou meio-aberto',
+                   '# TYPE empregaai_disjuntor_aberto gauge',
+                   f"empregaai_disjuntor_aberto {int(protecao['disjuntor']['estado'] != 'fechado')}"]
+        return '\n'.join(linhas) + '\n'
+
+# métrica → (ajuda, nome do rótulo extra)
+CONTADORES = {
+    'requisicoes':  ('Requisições POST por status HTTP', 'status'),
+    'fallbacks':    ('Respostas (ou seções/lotes) servidas pelo fallback local', 'tipo'),
+    'erros_modelo': ('Chamadas ao modelo que falharam, por tipo de erro', 'erro'),
+    'json_reparado': ('Respostas do modelo reparadas (truncado) ou completadas (complemento)', 'tipo'),
+    'rejeicoes_modelo': ('Chamadas recusadas antes do modelo (disjuntor aberto ou sem vaga no limitador)', 'motivo'),
+}
+
+def rotulo_prom(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+METRICAS = Metricas()
+
+def metricas(query):
+    """Texto do Prometheus; ?perfil=<id> devolve um perfil cProfile (?perfil= lista os recentes)"""
+    if 'perfil' in query:
+        return METRICAS.texto_perfil(query['perfil'][0])
+    return METRICAS.prometheus()
+
+# ─── proteção do upstream (limitador + disjuntor) ─────────────────────────────
+
+class SobrecargaIA(Exception):
+    """Chamada recusada antes de ir ao modelo: disjuntor aberto ou sem vaga no prazo da rota"""
+    def __init__(self, motivo, mensagem):
+        super().__init__(mensagem)
+        self.motivo = motivo
+
+class LimitadorAIMD:
+    """Teto de chamadas simultâneas ao modelo ajustado por AIMD: resposta no ritmo normal
+    soma 1/limite (≈ +1 por rodada completa); sobrecarga (429/529/5xx, timeout) ou latência
+    acima de LENTIDAO × a mediana da rota multiplica por RECUO, no máximo uma vez por
+    INTERVALO_RECUO — uma rajada de erros simultâneos conta como um sinal só"""
+
+    RECUO           = 0.7
+    LENTIDAO        = 2.0
+    INTERVALO_RECUO = 1.0
+
+    def __init__(self, maximo, minimo=1):
+        self.maximo, self.minimo = maximo, minimo
+        self.limite  = float(maximo)
+        self.em_voo  = 0
+        self._recuo  = 0.0
+        self._cond   = threading.Condition()
+
+    def adquirir(self, prazo):
+        """Espera vaga até `prazo` (time.monotonic); sem vaga, SobrecargaIA"""
+        with self._cond:
+            while self.em_voo >= int(self.limite):
+                resta = prazo - time.monotonic()
+                if resta <= 0:
+                    raise SobrecargaIA('limitador', f'sem vaga no limitador ({self.em_voo}/{int(self.limite)})')
+                self._cond.wait(resta)
+            self.em_voo += 1
+
+    def liberar(self, sinal):
+        """sinal: 'ok', 'congestao' ou None (erro que não diz nada sobre a carga)"""
+        with self._cond:
+            self.em_voo -= 1
+            agora = time.monotonic()
+            if sinal == 'congestao':
+                if agora - self._recuo >= self.INTERVALO_RECUO:
+                    self.limite = max(self.minimo, self.limite * self.RECUO)
+                    self._recuo = agora
+            elif sinal == 'ok':
+                self.limite = min(self.maximo, self.limite + 1 / self.limite)
+            self._cond.notify_all()
+
+class Disjuntor:
+    """Fechado → aberto depois de FALHAS sobrecargas seguidas, ou já na primeira que trouxer
+    Retry-After (aberto pelo tempo pedido). Aberto, as chamadas vão direto ao fallback até o
+    fim do resfriamento; então uma chamada de teste (meio-aberto) fecha o disjuntor ou o
+    reabre com o resfriamento dobrado."""
+
+    FALHAS           = 5
+    RESFRIAMENTO     = 15.0
+    RESFRIAMENTO_MAX = 120.0
+
+    def __init__(self):
+        self.estado       = 'fechado'
+        self.falhas       = 0
+        self.resfriamento = self.RESFRIAMENTO
+        self._ate         = 0.0
+        self._testando    = False
+        self._lock        = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == 'fechado':
+                return
+            resta = self._ate - time.monotonic()
+            if resta > 0:
+                raise SobrecargaIA('disjuntor', f'disjuntor aberto por mais {resta:.0f}s')
+            if self._testando:
+                raise SobrecargaIA('disjuntor', 'disjuntor meio-aberto: chamada de teste em andamento')
+            self.estado, self._testando = 'meio-aberto', True
+
+    def sucesso(self):
+        with self._lock:
+            self.estado, self.falhas, self._testando = 'fechado', 0, False
+            self.resfriamento = self.RESFRIAMENTO
+
+    def falha(self, espera=None):
+        with self._lock:
+            self.falhas += 1
+            if self.estado == 'meio-aberto':
+                self.resfriamento = min(self.RESFRIAMENTO_MAX, self.resfriamento * 2)
+                self._abrir(max(espera or 0, self.resfriamento))
+            elif espera:
+                self._abrir(min(espera, self.RESFRIAMENTO_MAX))
+            elif self.falhas >= self.FALHAS:
+                self._abrir(self.resfriamento)
+
+    def neutro(self):
+        """Erro que não é do upstream (ex.: 400): libera o teste sem mudar o estado"""
+        with self._lock:
+            self._testando = False
+
+    def _abrir(self, segundos):
+        self.estado, self._testando = 'aberto', False
+        self._ate = max(self._ate, time.monotonic() + segundos)
+
+    def resumo(self):
+        with self._lock:
+            return {'estado': self.estado, 'falhas_seguidas': self.falhas,
+                    'aberto_por_s': round(max(0.0, self._ate - time.monotonic()), 1)}
+
+LIMITADOR = LimitadorAIMD(maximo=POOL.max_por_host)
+DISJUNTOR = Disjuntor()
+
+def sobrecarga(ex):
+    """(é sinal de upstream sobrecarregado?, Retry-After em s)"""
+    if isinstance(ex, ErroHTTP):
+        return ex.status in (429, 529) or ex.status >= 500, retry_after(ex)
+    return isinstance(ex, (OSError, http.client.HTTPException)), None
+
+@contextlib.contextmanager
+def vaga_no_modelo(rota, cfg):
+    """Disjuntor + limitador em volta de uma ida ao modelo. O prazo da rota (cfg['timeout'])
+    cobre a espera por vaga e a chamada; devolve o timeout que sobrou para o upstream."""
+    prazo = time.monotonic() + cfg['timeout']
+    try:
+        DISJUNTOR.permitir()
+        try:
+            LIMITADOR.adquirir(prazo)
+        except SobrecargaIA:
+            DISJUNTOR.neutro()          # meio-aberto: a chamada de teste nem saiu, libera para a próxima
+            raise
+    except SobrecargaIA as ex:
+        METRICAS.contar('rejeicoes_modelo', rota, ex.motivo)
+        raise
+    inicio, erro, ok = time.monotonic(), None, False
+    try:
+        yield max(1.0, prazo - inicio)
+        ok = True
+    except Exception as ex:
+        erro = ex
+        raise
+    finally:
+        if ok:
+            p50   = LATENCIAS.percentil(cfg['modelo'], rota, .5, min_amostras=5)
+            lenta = p50 is not None and (time.monotonic() - inicio) * 1000 > LimitadorAIMD.LENTIDAO * p50
+            LIMITADOR.liberar('congestao' if lenta else 'ok')
+            DISJUNTOR.sucesso()
+        else:
+            congestao, espera = sobrecarga(erro) if erro is not None else (False, None)
+            LIMITADOR.liberar('congestao' if congestao else None)
+            if congestao: DISJUNTOR.falha(espera)
+            else:         DISJUNTOR.neutro()
+
+def estatisticas_protecao():
+    return {'limitador': {'limite': round(LIMITADOR.limite, 2), 'em_voo': LIMITADOR.em_voo,
+                          'maximo': LIMITADOR.maximo},
+            'disjuntor': DISJUNTOR.resumo()}
+
+# ─── chamadas ao modelo ───────────────────────────────────────────────────────
+
+def headers_anthropic():
     api_key = os.environ.get('ANTHROPIC_API_KEY','')
     if not api_key:
         raise Exception('ANTHROPIC_API_KEY não configurada')
-    body = json.dumps({
-        'model':      'claude-sonnet-4-20250514',
-        'max_tokens': max_tokens,
-        'messages':   [{'role':'user','content': prompt}]
-    }).encode()
-    req = urllib.request.Request(
-        'https://api.anthropic.com/v1/messages', data=body,
-        headers={'Content-Type':'application/json',
-                 'x-api-key':api_key,
-                 'anthropic-version':'2023-06-01'}
-    )
-    with urllib.request.urlopen(req, timeout=45) as r:
-        result = json.loads(r.read().decode())
-    return result['content'][0]['text']
+    return {'x-api-key':api_key, 'anthropic-version':'2023-06-01'}
+
+# o provedor só guarda prefixos a partir deste tamanho (tokens); abaixo, cache_control não
+# faz nada. Hoje nenhum sistema chega lá (SISTEMA_GERAR ~550 tokens, os outros ~150-180),
+# então o marcador só entra se um prefixo crescer o bastante
+MIN_CACHE_TOKENS = {'haiku': 2048}     # demais modelos: 1024
+
+def prefixo_cacheavel(sistema, modelo):
+    """Estimativa folgada (~3 caracteres por token em pt-BR) contra o mínimo do modelo"""
+    minimo = next((n for k, n in MIN_CACHE_TOKENS.items() if k in modelo), 1024)
+    return sum(len(t) for t in sistema) // 3 >= minimo
+
+def corpo_mensagens(prompt, cfg, sistema=()):
+    """Corpo da messages API. `sistema` são os blocos fixos da rota; o último leva
+    cache_control quando o prefixo passa do mínimo do provedor (ver prefixo_cacheavel).
+    `prompt` é o texto do usuário ou uma lista de partes."""
+    partes = [prompt] if isinstance(prompt, str) else list(prompt)
+    corpo  = {
+        'model':      cfg['modelo'],
+        'max_tokens': cfg['max_tokens'],
+        'messages':   [{'role':'user','content': [{'type':'text','text':t} for t in partes]}]
+    }
+    if cfg['temperatura'] is not None:
+        corpo['temperature'] = cfg['temperatura']
+    if sistema:
+        corpo['system'] = [{'type':'text','text':t} for t in sistema]
+        if prefixo_cacheavel(sistema, cfg['modelo']):
+            corpo['system'][-1]['cache_control'] = {'type':'ephemeral'}
+    return corpo
+
+def chave_ia(prompt, sistema, cfg):
+    partes = [prompt] if isinstance(prompt, str) else list(prompt)
+    return CacheRespostas.chave('\x00'.join(list(sistema) + partes), cfg['modelo'],
+                                f"{cfg['max_tokens']}/{cfg['temperatura']}")
+
+# uso de tokens por rota, inclusive leitura/escrita do cache de prompt
+USO = {}
+_uso_lock = threading.Lock()
+CAMPOS_USO = ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens')
+
+def registrar_uso(rota, uso, ms):
+    with _uso_lock:
+        c = USO.setdefault(rota or '-', collections.Counter())
+        c['chamadas'] += 1
+        c['ms']       += round(ms)
+        for campo in CAMPOS_USO:
+            c[campo] += uso.get(campo) or 0
+
+def estatisticas_uso():
+    with _uso_lock:
+        return {rota: dict(c) for rota, c in USO.items()}
+
+def chamar_ia(prompt, max_tokens=None, timeout=None, sistema=(), rota='', ajustes=None):
+    """Modelo, max_tokens, timeout e temperatura vêm de ROTEAMENTO[rota] (ver config_ia).
+    Chamadas idênticas simultâneas (duplo clique, mesma vaga) dividem uma só ida ao modelo."""
+    cfg = config_ia(rota, ajustes, max_tokens, timeout)
+    return VOO.executar(chave_ia(prompt, sistema, cfg), lambda: _chamar_ia(prompt, cfg, sistema, rota))
+
+def _chamar_ia(prompt, cfg, sistema, rota):
+    with vaga_no_modelo(rota, cfg) as timeout:
+        inicio = time.monotonic()
+        try:
+            result = post_json(
+                url_base('anthropic') + '/v1/messages',
+                corpo_mensagens(prompt, cfg, sistema),
+                headers_anthropic(),
+                timeout=timeout
+            )
+        except Exception as ex:
+            METRICAS.contar('erros_modelo', rota, f'HTTP {ex.status}' if isinstance(ex, ErroHTTP) else type(ex).__name__)
+            raise
+        finally:
+            ms = (time.monotonic() - inicio) * 1000
+            LATENCIAS.registrar(cfg['modelo'], rota, ms)
+            METRICAS.registrar(rota or '-', 'upstream', ms)
+    registrar_uso(rota, result.get('usage',{}), ms)
+    return RespostaIA(result['content'][0]['text'], result.get('stop_reason'))
+
+class RespostaIA(str):
+    """Texto do modelo com o stop_reason da API ('max_tokens' = saída cortada)"""
+    __slots__ = ('stop_reason',)
+
+    def __new__(cls, texto, stop_reason=None):
+        obj = super().__new__(cls, texto)
+        obj.stop_reason = stop_reason
+        return obj
+
+def truncada(texto):
+    return getattr(texto, 'stop_reason', None) == 'max_tokens'
+
+_DECODER    = json.JSONDecoder()
+_TOKENS_JSON = r'[\\"{}\[\],:]'
+
+def extrair_json(texto, reparar=False):
+    """Primeiro valor JSON (objeto ou array) do texto: ignora cercas de markdown e prosa antes
+    ou depois. Começa no primeiro '{' ou '[' e, se dali não sai JSON (ex.: '{o JSON}' na prosa),
+    tenta o próximo. Com reparar=True (saída cortada em max_tokens) fecha string, arrays e
+    objetos abertos. Devolve (dados, chave de topo cujo valor ficou pela metade ou None)."""
+    erro = None
+    for m in re.finditer(r'[{\[]', texto):
+        try:
+            return _DECODER.raw_decode(texto, m.start())[0], None
+        except json.JSONDecodeError as ex:
+            erro = erro or ex
+        if reparar:
+            reparado, incompleta = reparar_json(texto, m.start())
+            try:
+                return json.loads(reparado), incompleta
+            except json.JSONDecodeError:
+                pass
+    if erro is None:
+        raise ValueError('resposta sem JSON')
+    raise erro
+
+def reparar_json(texto, ini):
+    """Corta texto[ini:] no último ponto em que o JSON fecha válido — uma string de valor
+    aberta é fechada onde parou; chave ou número pela metade saem — e fecha a pilha"""
+    pilha, espera_chave = [], []       # espera_chave[k]: no objeto do nível k, a próxima string é chave
+    em_str = eh_chave = False
+    escapado = -1
+    corte, nivel_corte = ini, 0        # último ponto seguro e a altura da pilha nele
+    chave_topo = str_ini = None
+    for m in re.compile(_TOKENS_JSON).finditer(texto, ini):
+        i, c = m.start(), m.group()
+        if i == escapado:
+            continue
+        if em_str:
+            if c == '\\':
+                escapado = i + 1
+            elif c == '"':
+                em_str = False
+                if eh_chave:
+                    if len(pilha) == 1: chave_topo = texto[str_ini+1:i]
+                else:
+                    corte, nivel_corte = i + 1, len(pilha)
+            continue
+        if c == '"':
+            em_str, str_ini = True, i
+            eh_chave = bool(pilha) and pilha[-1] == '{' and espera_chave[-1]
+        elif c in '{[':
+            pilha.append(c); espera_chave.append(c == '{')
+            if len(pilha) == 1: corte, nivel_corte = i + 1, 1     # aninhado vazio não conta
+
+        elif c in '}]':
+            pilha.pop(); espera_chave.pop()
+            if not pilha:
+                return texto[ini:i+1], None
+            corte, nivel_corte = i + 1, len(pilha)
+        elif c == ':':
+            espera_chave[-1] = False
+        elif c == ',':
+            corte, nivel_corte = i, len(pilha)
+            if pilha[-1] == '{': espera_chave[-1] = True
+    if em_str and not eh_chave:
+        fim = len(texto)
+        if escapado == fim or (texto[escapado:escapado+1] == 'u' and fim - escapado < 5):
+            fim = escapado - 1                 # escape (\\ ou \\uXXXX) pela metade no fim
+        base, abertos = texto[ini:fim] + '"', pilha
+    else:
+        base, abertos = texto[ini:corte], pilha[:nivel_corte]
+    incompleta = chave_topo if len(pilha) > 1 or (em_str and not eh_chave and len(pilha) == 1) else None
+    return base + ''.join('}' if p == '{' else ']' for p in reversed(abertos)), incompleta
+
+def ler_json_ia(text):
+    """JSON da resposta do modelo; saída cortada em max_tokens volta reparada e sem o campo
+    de topo que ficou pela metade — quem precisa dele cai no próprio fallback"""
+    reparar = truncada(text)
+    with METRICAS.fase('json'):
+        dados, incompleta = extrair_json(text, reparar)
+    if reparar and isinstance(dados, dict):
+        dados.pop(incompleta, None)
+    return dados
+
+def ler_sse(resp):
+    """Gera (evento, dados) de uma resposta text/event-stream"""
+    evento, linhas = 'message', []
+    while True:
+        linha = resp.readline()
+        if not linha: break
+        linha = linha.decode('utf-8').rstrip('\r\n')
+        if not linha:
+            if linhas: yield evento, json.loads('\n'.join(linhas))
+            evento, linhas = 'message', []
+        elif linha.startswith('event:'):
+            evento = linha[6:].strip()
+        elif linha.startswith('data:'):
+            linhas.append(linha[5:].lstrip())
+
+def chamar_ia_stream(prompt, max_tokens=None, sistema=(), rota='', ajustes=None):
+    """Como chamar_ia, mas gera os pedaços de texto conforme o modelo escreve"""
+    cfg    = config_ia(rota, ajustes, max_tokens)
+    corpo  = json.dumps(dict(corpo_mensagens(prompt, cfg, sistema), stream=True)).encode('utf-8')
+    uso    = {}
+    hdrs = dict(headers_anthropic(), **{'Content-Type':'application/json', 'Accept':'text/event-stream'})
+    with vaga_no_modelo(rota, cfg) as timeout:
+        inicio = time.monotonic()
+        with POOL.abrir('POST', url_base('anthropic') + '/v1/messages', corpo, hdrs, timeout=timeout) as r:
+            if r.status >= 400:
+                raise ErroHTTP(r.status, r.read().decode('utf-8','replace'), dict(r.getheaders()))
+            for evento, dados in ler_sse(r):
+                if evento == 'content_block_delta' and dados['delta'].get('type') == 'text_delta':
+                    yield dados['delta']['text']
+                elif evento == 'message_start':
+                    uso.update(dados.get('message',{}).get('usage',{}))
+                elif evento == 'message_delta':
+                    uso.update(dados.get('usage',{}))
+                elif evento == 'error':
+                    erro = dados.get('error',{})
+                    raise ErroHTTP(529 if erro.get('type') == 'overloaded_error' else 500,
+                                   erro.get('message','erro no stream'))
+            r.read()
+        ms = (time.monotonic() - inicio) * 1000
+    LATENCIAS.registrar(cfg['modelo'], rota, ms)
+    METRICAS.registrar(rota or '-', 'upstream', ms)
+    registrar_uso(rota, uso, ms)
+
+class ParserCamposJSON:
+    """Parser JSON incremental: devolve cada campo do objeto de topo assim que o valor fecha.
+    Ignora o que vier antes do primeiro '{' (cercas de markdown, prosa)."""
+
+    def __init__(self):
+        self.buf    = ''
+        self.nivel  = 0
+        self.em_str = False
+        self.escape = False
+        self.ini    = None    # início da chave/valor atual no buffer
+        self.chave  = None
+        self.fim    = False
+
+    def alimentar(self, pedaco):
+        if self.fim: return []
+        prontos, buf, i0 = [], self.buf + pedaco, len(self.buf)
+        for i in range(i0, len(buf)):
+            ch = buf[i]
+            if self.nivel == 0:
+                if ch == '{': self.nivel = 1
+                continue
+            if self.em_str:
+                if self.escape:    self.escape = False
+                elif ch == '\\': self.escape = True
+                elif ch == '"':    self.em_str = False
+                continue
+            if ch == '"':
+                self.em_str = True
+                if self.ini is None: self.ini = i
+            elif ch in '{[':
+                if self.nivel == 1 and self.ini is None: self.ini = i
+                self.nivel += 1
+            elif ch in '}]':
+                self.nivel -= 1
+                if self.nivel == 0:
+                    self._emitir(buf, i, prontos)
+                    self.fim = True
+                    break
+            elif self.nivel == 1:
+                if ch == ':':
+                    self.chave = json.loads(buf[self.ini:i])
+                    self.ini   = None
+                elif ch == ',':
+                    self._emitir(buf, i, prontos)
+                elif self.ini is None and not ch.isspace():
+                    self.ini = i    # número, true, false, null
+        corte    = self.ini if self.ini is not None else len(buf)
+        self.buf = buf[corte:]
+        if self.ini is not None: self.ini = 0
+        return prontos
+
+    def _emitir(self, buf, i, prontos):
+        if self.chave is not None and self.ini is not None:
+            try:
+                prontos.append((self.chave, json.loads(buf[self.ini:i])))
+            except ValueError:
+                pass    # valor malformado: quem chamou completa com o fallback
+        self.chave, self.ini = None, None
+
+# ─── cache de respostas ───────────────────────────────────────────────────────
+
+class CacheRespostas:
+    """Cache das respostas do modelo: LRU em memória com TTL e camada opcional em SQLite,
+    que sobrevive a reinícios da instância (ex.: EMPREGAAI_CACHE_DB=/tmp/empregaai-cache.db)"""
+
+    def __init__(self, max_itens=256, ttl=6*3600, caminho_db=None):
+        self.max_itens  = max_itens
+        self.ttl        = ttl
+        self.caminho_db = caminho_db
+        self._itens     = collections.OrderedDict()   # chave → (expira_em, texto)
+        self._lock      = threading.Lock()
+        self._db        = None
+        self._gravacoes = 0
+        self.acertos = self.acertos_disco = self.faltas = self.expulsoes = self.expirados = 0
+
+    @staticmethod
+    def chave(prompt, modelo, max_tokens):
+        """Hash do prompt normalizado (espaços colapsados) + modelo + max_tokens"""
+        import hashlib
+        normal = ' '.join(prompt.split())
+        return hashlib.sha256(f'{modelo}\x00{max_tokens}\x00{normal}'.encode('utf-8')).hexdigest()
+
+    def _disco(self):
+        if self._db is None and self.caminho_db:
+            import sqlite3
+            self._db = sqlite3.connect(self.caminho_db, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS cache (chave TEXT PRIMARY KEY, expira REAL, texto TEXT)')
+        return self._db
+
+    def obter(self, chave):
+        agora = time.time()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is not None:
+                if item[0] > agora:
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    return item[1]
+                del self._itens[chave]
+                self.expirados += 1
+            db = self._disco()
+            if db is not None:
+                row = db.execute('SELECT expira, texto FROM cache WHERE chave=?', (chave,)).fetchone()
+                if row and row[0] > agora:
+                    self._inserir(chave, row[0], row[1])
+                    self.acertos_disco += 1
+                    return row[1]
+            self.faltas += 1
+            return None
+
+    def guardar(self, chave, texto):
+        expira = time.time() + self.ttl
+        with self._lock:
+            self._inserir(chave, expira, texto)
+            db = self._disco()
+            if db is not None:
+                db.execute('INSERT OR REPLACE INTO cache VALUES (?,?,?)', (chave, expira, texto))
+                self._gravacoes += 1
+                if self._gravacoes % 100 == 0:
+                    db.execute('DELETE FROM cache WHERE expira < ?', (time.time(),))
+
+    def _inserir(self, chave, expira, texto):
+        self._itens[chave] = (expira, texto)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+            self.expulsoes += 1
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.acertos_disco + self.faltas
+            return {
+                'itens': len(self._itens), 'acertos': self.acertos, 'acertos_disco': self.acertos_disco,
+                'faltas': self.faltas, 'expulsoes': self.expulsoes, 'expirados': self.expirados,
+                'taxa_acerto': round((self.acertos + self.acertos_disco) / consultas, 4) if consultas else 0.0,
+            }
+
+CACHE = CacheRespostas(
+    max_itens  = int(os.environ.get('EMPREGAAI_CACHE_ITENS', 256)),
+    ttl        = int(os.environ.get('EMPREGAAI_CACHE_TTL', 6*3600)),
+    caminho_db = os.environ.get('EMPREGAAI_CACHE_DB') or None,
+)
+
+class VooUnico:
+    """Single-flight: a primeira chamada com a chave executa; as simultâneas esperam e
+    recebem o mesmo resultado — ou a mesma exceção, e cada rota cai no seu fallback"""
+
+    class _Voo:
+        __slots__ = ('evento', 'resultado', 'erro')
+        def __init__(self):
+            self.evento, self.resultado, self.erro = threading.Event(), None, None
+
+    def __init__(self):
+        self._lock          = threading.Lock()
+        self._em_voo        = {}
+        self.compartilhadas = 0
+
+    def executar(self, chave, fn):
+        with self._lock:
+            voo   = self._em_voo.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._em_voo[chave] = self._Voo()
+            else:
+                self.compartilhadas += 1
+        if not lider:
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            return voo.resultado
+        try:
+            voo.resultado = fn()
+            return voo.resultado
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_voo[chave]
+            voo.evento.set()
+
+VOO = VooUnico()
+
+def chamar_ia_cache(prompt, interpretar, max_tokens=None, timeout=None, sistema=(), rota='', ajustes=None):
+    """chamar_ia com cache; só é guardado o que `interpretar` aceitar e não veio de saída
+    cortada em max_tokens (reparada, não iria para o cache por 6 h). Resultado em dict vai
+    como JSON já limpo — o complemento não se repete no acerto."""
+    cfg   = config_ia(rota, ajustes, max_tokens, timeout)
+    chave = chave_ia(prompt, sistema, cfg)
+    texto = CACHE.obter(chave)
+    if texto is not None:
+        return interpretar(texto)
+    texto     = VOO.executar(chave, lambda: _chamar_ia(prompt, cfg, sistema, rota))
+    resultado = interpretar(texto)
+    if not truncada(texto):
+        CACHE.guardar(chave, json.dumps(resultado, ensure_ascii=False) if isinstance(resultado, dict) else texto)
+    return resultado
 
 # ─── vagas ────────────────────────────────────────────────────────────────────
 
-def montar_vagas(cidade, area):
+# na ordem dos argumentos da função de montagem (ver montagem_portais)
+CAMPOS_PORTAL = ('area', 'cidade', 'area_q', 'cidade_q', 'estado_q', 'estado_min_q',
+                 'area_hifen_q', 'cidade_hifen_q', 'cidade_estado_q')
+
+class ModeloURL:
+    """Modelo '{campo}' conferido ao carregar o registro — campo desconhecido falha ao carregar,
+    não ao montar a URL. Com os campos como variáveis locais, o modelo já é uma f-string."""
+    __slots__ = ('modelo', 'fonte')
+
+    def __init__(self, modelo):
+        pedacos = re.split(r'\{(\w+)\}', modelo)     # [literal, campo, literal, ..., literal]
+        if set(pedacos[1::2]).difference(CAMPOS_PORTAL) or any('{' in p or '}' in p for p in pedacos[0::2]):
+            raise ValueError(f'modelo de portal inválido: {modelo}')
+        self.modelo = modelo
+        self.fonte  = 'f' + repr(modelo)
+
+def carregar_portais(caminho=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'portais.json')):
+    """Registro de portais de vagas (api/portais.json): portal novo é só uma entrada no arquivo.
+    Campos dos modelos: area, cidade e, já codificados para URL, os terminados em _q
+    (ver CAMPOS_PORTAL)."""
+    with open(caminho, encoding='utf-8') as f:
+        return [{'cargo': ModeloURL(p['cargo']), 'empresa': p['empresa'], 'link': ModeloURL(p['link']),
+                 'fonte': p['fonte'], 'descricao': p['descricao']} for p in json.load(f)]
+
+@functools.lru_cache(maxsize=None)
+def montagem_portais():
+    """Registro carregado na primeira montagem de vagas, não no import, e compilado numa só
+    função com um dict de f-strings por portal — o mesmo código que se escreveria à mão"""
+    itens = ''.join(f"{{'cargo': {p['cargo'].fonte}, 'empresa': {p['empresa']!r}, 'cidade': cidade, "
+                    f"'link': {p['link'].fonte}, 'fonte': {p['fonte']!r}, 'descricao': {p['descricao']!r}}}, "
+                    for p in carregar_portais())
+    return compilar(f"lambda {', '.join(CAMPOS_PORTAL)}: ({itens})")
+
+@functools.lru_cache(maxsize=512)
+def _vagas(cidade, area):
     area_limpa  = limpar_area(area)
     cidade_str  = cidade.split(',')[0].strip()
     estado      = cidade.split(',')[1].strip() if ',' in cidade else 'AM'
-    a  = urllib.parse.quote(area_limpa)
-    c  = urllib.parse.quote(cidade_str)
-    e  = urllib.parse.quote(estado)
-    ah = urllib.parse.quote(hifenado(area_limpa))
-    ch = urllib.parse.quote(hifenado(cidade_str))
-    ci = urllib.parse.quote(cidade_str + ', ' + estado)
-    return [
-        {'cargo':f'Vagas de {area_limpa} — Indeed','empresa':'Múltiplas','cidade':cidade_str,
-         'link':f'https://br.indeed.com/q-{ah}-l-{ci}-vagas.html','fonte':'Indeed Brasil',
-         'descricao':'Maior buscador de vagas — resultado filtrado pela sua cidade'},
-        {'cargo':f'Vagas de {area_limpa} — LinkedIn','empresa':'Múltiplas','cidade':cidade_str,
-         'link':f'https://www.linkedin.com/jobs/search/?keywords={a}&location={c}%2C%20{e}%2C%20Brasil',
-         'fonte':'LinkedIn Vagas','descricao':'Vagas exclusivas que não aparecem em outros portais'},
-        {'cargo':f'Vagas de {area_limpa} — Catho','empresa':'Múltiplas','cidade':cidade_str,
-         'link':f'https://www.catho.com.br/vagas/?q={a}&l={c}%2C+{e}',
-         'fonte':'Catho','descricao':'Um dos maiores portais de emprego do Brasil'},
-        {'cargo':f'Vagas de {area_limpa} em {cidade_str} — InfoJobs','empresa':'Múltiplas','cidade':cidade_str,
-         'link':f'https://www.infojobs.com.br/empregos-em-{ch},-{urllib.parse.quote(estado.lower())}.aspx',
-         'fonte':'InfoJobs','descricao':'Busca direta por cidade — resultado da sua região'},
-        {'cargo':f'Vagas de {area_limpa} — Gupy','empresa':'Grandes empresas','cidade':cidade_str,
-         'link':f'https://portal.gupy.io/job-search/term={a}',
-         'fonte':'Gupy','descricao':'Ambev, iFood, Nubank e outras grandes empresas'},
-        {'cargo':f'Vagas de {area_limpa} — Empregos.com.br','empresa':'Múltiplas','cidade':cidade_str,
-         'link':f'https://www.empregos.com.br/vagas/{ch}/{ah}',
-         'fonte':'Empregos.com.br','descricao':'Forte em vagas locais e pequenas empresas'},
-        {'cargo':f'Vagas de {area_limpa} — Vagas.com','empresa':'Múltiplas','cidade':cidade_str,
-         'link':f'https://www.vagas.com.br/vagas-de-{ah}+em+{ch}',
-         'fonte':'Vagas.com','descricao':'Portal consolidado com vagas verificadas'},
-        {'cargo':f'Vagas de {area_limpa} — Curriculum.com.br','empresa':'Múltiplas','cidade':cidade_str,
-         'link':f'https://www.curriculum.com.br/vagas/?term={a}&cidade={c}&estado={e}',
-         'fonte':'Curriculum.com.br','descricao':'9 milhões de profissionais — forte no Norte/Nordeste'},
-    ]
+    quote       = urllib.parse.quote
+    return montagem_portais()(area_limpa, cidade_str, quote(area_limpa), quote(cidade_str), quote(estado),
+                              quote(estado.lower()), quote(hifenado(area_limpa)), quote(hifenado(cidade_str)),
+                              quote(cidade_str + ', ' + estado))
 
-# ─── rota: gerar currículo ─────────────────────────────────────────────────────
+def montar_vagas(cidade, area):
+    """Links de busca por portal; memorizado por (cidade, area) — cada chamada recebe cópias"""
+    return [dict(v) for v in _vagas(cidade, area)]
 
-def rota_gerar(dados):
-    area         = limpar_area(dados.get('areas','Administrativo'))
-    cidade       = dados.get('cidade','Manaus, AM')
-    esc          = dados.get('escolaridade','')
-    ano          = dados.get('ano_conclusao','')
-    formacao     = esc + (' — '+ano if ano else '')
+def estatisticas_vagas():
+    info      = _vagas.cache_info()
+    consultas = info.hits + info.misses
+    return {'itens': info.currsize, 'acertos': info.hits, 'faltas': info.misses,
+            'taxa_acerto': round(info.hits / consultas, 4) if consultas else 0.0}
 
-    prompt = f"""Você é especialista em RH e redação de currículos para primeiro emprego no Brasil.
-Gere um pacote profissional RICO e DETALHADO para este candidato.
+# ─── rota: gerar currículo ─────────────────────────────────────────────────────
 
-DADOS:
-Nome: {dados.get('nome')}  |  Cidade: {cidade}
-Email: {dados.get('email')}  |  Telefone: {dados.get('telefone')}
-Formação: {formacao}  |  Área: {dados.get('areas')}
-Habilidades: {dados.get('habilidades')}
-Experiências (use os períodos EXATOS informados): {dados.get('experiencias')}
-Sobre si: {dados.get('sobre')}
-Objetivo: {dados.get('objetivo')}
+CAMPOS_GERAR = ('cv_html', 'linkedin', 'email_candidatura', 'dicas_entrevista', 'analise_contratacao')
 
-INSTRUÇÕES cv_html:
-Use SOMENTE estas classes CSS (já existem no site):
+INSTRUCOES_CV = """Use SOMENTE estas classes CSS (já existem no site):
 cv-header-info | cv-name | cv-role | cv-contact-line | cv-divider | cv-sec | cv-sec-title | cv-body | cv-bullet | cv-skills-wrap | cv-skill-tag
 
 Estrutura obrigatória:
@@ -123,14 +1181,53 @@ Para experiências: <div class="cv-bullet">• texto</div>
 
 Objetivo: 2-3 frases ricas e profissionais.
 Experiências: bullets detalhados com períodos exatos do usuário.
-Sobre mim: 2-3 frases elaboradas.
+Sobre mim: 2-3 frases elaboradas."""
+
+def dados_candidato(dados):
+    cidade       = dados.get('cidade','Manaus, AM')
+    esc          = dados.get('escolaridade','')
+    ano          = dados.get('ano_conclusao','')
+    formacao     = esc + (' — '+ano if ano else '')
+
+    return f"""DADOS:
+Nome: {dados.get('nome')}  |  Cidade: {cidade}
+Email: {dados.get('email')}  |  Telefone: {dados.get('telefone')}
+Formação: {formacao}  |  Área: {dados.get('areas')}
+Habilidades: {dados.get('habilidades')}
+Experiências (use os períodos EXATOS informados): {dados.get('experiencias')}
+Sobre si: {dados.get('sobre')}
+Objetivo: {dados.get('objetivo')}"""
+
+# instruções fixas: vão num bloco de sistema, antes dos dados (ver corpo_mensagens)
+SISTEMA_GERAR = f"""Você é especialista em RH e redação de currículos para primeiro emprego no Brasil.
+Gere um pacote profissional RICO e DETALHADO para o candidato cujos DADOS vêm na mensagem.
+
+INSTRUÇÕES cv_html:
+{INSTRUCOES_CV}
 
 Responda APENAS JSON válido sem markdown:
 {{"cv_html":"...","linkedin":{{"titulo":"...","sobre":"3 parágrafos completos"}},"email_candidatura":"3-4 parágrafos profissionais","dicas_entrevista":["dica detalhada 1","dica detalhada 2","dica detalhada 3","dica detalhada 4","dica detalhada 5"],"analise_contratacao":{{"porcentagem":72,"nivel":"Bom","pontos_fortes":["...","...","..."],"pontos_melhorar":["...","..."],"resumo":"..."}}}}"""
 
-    text    = chamar_ia(prompt, 4000)
-    cleaned = text.replace('```json','').replace('```','').strip()
-    ia      = json.loads(cleaned)
+@METRICAS.medir('prompt')
+def prompt_gerar(dados):
+    """(blocos de sistema, mensagem do usuário)"""
+    return [SISTEMA_GERAR], dados_candidato(dados)
+
+def rota_gerar(dados):
+    if dados.get('paralelo', GERAR_PARALELO):
+        return rota_gerar_paralelo(dados)
+    cidade  = dados.get('cidade','Manaus, AM')
+    sistema, prompt = prompt_gerar(dados)
+    try:
+        ia = chamar_ia_cache(prompt, lambda t: resposta_validada('/api/gerar', t, prompt, sistema, dados.get('ia')),
+                             sistema=sistema, rota='/api/gerar', ajustes=dados.get('ia'))
+    except RespostaIncompleta as ex:
+        # como no gerar paralelo e no stream: só o que faltou vem do fallback (e nada vai para o cache)
+        print(f'[/api/gerar] {ex} — usando fallback nesses campos')
+        fb = fallback_gerar(dados)
+        for campo in ex.faltando:
+            METRICAS.contar('fallbacks', '/api/gerar', 'secao')
+        ia = dict(ex.dados, **{campo: fb[campo] for campo in ex.faltando})
     vagas   = montar_vagas(cidade, dados.get('areas','Administrativo'))
     return {
         'cv_html':             ia.get('cv_html',''),
@@ -141,82 +1238,612 @@ Responda APENAS JSON válido sem markdown:
         'vagas':               vagas
     }
 
+# ─── gerar em paralelo (uma chamada por seção) ────────────────────────────────
+
+GERAR_PARALELO = os.environ.get('EMPREGAAI_GERAR_PARALELO') == '1'
+
+# campo → (max_tokens, timeout em s, instrução, formato JSON esperado)
+SECOES_GERAR = {
+    'cv_html': (1800, 35,
+        'Escreva o currículo em HTML (campo cv_html).\n' + INSTRUCOES_CV,
+        '{"cv_html":"..."}'),
+    'linkedin': (700, 20,
+        'Escreva o perfil do LinkedIn: um título chamativo e o "sobre" em 3 parágrafos completos.',
+        '{"linkedin":{"titulo":"...","sobre":"3 parágrafos completos"}}'),
+    'email_candidatura': (700, 20,
+        'Escreva um email de candidatura em 3-4 parágrafos profissionais.',
+        '{"email_candidatura":"3-4 parágrafos profissionais"}'),
+    'dicas_entrevista': (600, 20,
+        'Escreva 5 dicas de entrevista detalhadas e específicas para este candidato.',
+        '{"dicas_entrevista":["dica detalhada 1","dica detalhada 2","dica detalhada 3","dica detalhada 4","dica detalhada 5"]}'),
+    'analise_contratacao': (500, 20,
+        'Analise as chances de contratação deste candidato com honestidade.',
+        '{"analise_contratacao":{"porcentagem":72,"nivel":"Bom","pontos_fortes":["...","...","..."],"pontos_melhorar":["...","..."],"resumo":"..."}}'),
+}
+
+_executor      = None
+_executor_lock = threading.Lock()
+
+def executor():
+    """Pool de threads compartilhado da instância (criado no primeiro uso)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _executor = ThreadPoolExecutor(max_workers=int(os.environ.get('EMPREGAAI_THREADS', 16)),
+                                           thread_name_prefix='empregaai')
+        return _executor
+
+def sistema_secao(campo):
+    _, _, instrucao, formato = SECOES_GERAR[campo]
+    return f"""Você é especialista em RH e redação de currículos para primeiro emprego no Brasil.
+Os DADOS do candidato vêm na mensagem.
+
+{instrucao}
+
+Responda APENAS JSON válido sem markdown:
+{formato}"""
+
+def gerar_secao(dados, campo):
+    max_tokens, timeout, _, _ = SECOES_GERAR[campo]
+    with METRICAS.fase('prompt'):
+        prompt, sistema = dados_candidato(dados), [sistema_secao(campo)]
+    return chamar_ia_cache(prompt, ler_json_ia, max_tokens, timeout, sistema=sistema, rota='/api/gerar',
+                           ajustes=dados.get('ia'))[campo]
+
+def rota_gerar_paralelo(dados):
+    """Mesmo resultado de rota_gerar, com uma chamada menor por seção rodando em paralelo.
+    Seção que estoura o timeout ou falha usa o pedaço correspondente de fallback_gerar."""
+    ex      = executor()
+    inicio  = time.monotonic()
+    vagas   = ex.submit(montar_vagas, dados.get('cidade','Manaus, AM'), dados.get('areas','Administrativo'))
+    futuros = {campo: ex.submit(METRICAS.na_rota(gerar_secao), dados, campo) for campo in SECOES_GERAR}
+    resultado, falhas, fb = {}, [], None
+    for campo, fut in futuros.items():
+        try:
+            resultado[campo] = fut.result(timeout=max(0, inicio + SECOES_GERAR[campo][1] - time.monotonic()))
+        except Exception as ex_secao:
+            print(f'[/api/gerar] seção {campo} falhou: {ex_secao!r} — usando fallback')
+            METRICAS.contar('fallbacks', '/api/gerar', 'secao')
+            falhas.append(campo)
+            fb = fb or fallback_gerar(dados)
+            resultado[campo] = fb[campo]
+    if len(falhas) == len(SECOES_GERAR):
+        raise Exception('todas as seções falharam')
+    resultado['vagas'] = vagas.result()
+    return resultado
+
+# ─── JSON do modelo: esquema por rota e complemento ──────────────────────────
+
+NUM = (int, float)
+
+# rota → campo → (tipos aceitos, max_tokens para pedir só esse campo de novo)
+ESQUEMAS = {
+    '/api/gerar': {campo: (tipo, SECOES_GERAR[campo][0]) for campo, tipo in
+                   (('cv_html', str), ('linkedin', dict), ('email_candidatura', str),
+                    ('dicas_entrevista', list), ('analise_contratacao', dict))},
+    '/api/feedback': {'nota': (NUM, 20), 'nivel': (str, 20), 'resumo': (str, 200), 'fortes': (list, 200),
+                      'melhorar': (list, 200), 'dica': (str, 200)},
+    '/api/chance':   {'porcentagem': (NUM, 20), 'nivel': (str, 20), 'sub': (str, 80),
+                      'pontos_fortes': (list, 200), 'pontos_melhorar': (list, 200)},
+}
+
+def campo_valido(rota, campo, v):
+    """Do tipo do esquema e não vazio (número pode ser 0; bool não conta como número)"""
+    tipos = ESQUEMAS[rota][campo][0]
+    return isinstance(v, tipos) and not isinstance(v, bool) and (isinstance(v, NUM) or bool(v))
+
+def campos_faltando(dados, rota):
+    """Campos do esquema ausentes, do tipo errado ou vazios"""
+    if not isinstance(dados, dict):
+        return list(ESQUEMAS[rota])
+    return [c for c in ESQUEMAS[rota] if not campo_valido(rota, c, dados.get(c))]
+
+class RespostaIncompleta(ValueError):
+    """Campos que nem o complemento trouxe; `dados` tem os que vieram válidos, para a rota
+    completar só o que falta com o fallback (e não guardar a mistura no cache)"""
+    def __init__(self, rota, dados, faltando):
+        super().__init__(f'{rota}: campos faltando depois do complemento: {", ".join(faltando)}')
+        self.dados, self.faltando = dados, faltando
+
+def resposta_validada(rota, texto, prompt, sistema, ajustes=None):
+    """JSON do modelo conferido com ESQUEMAS[rota]. Saída cortada em max_tokens é reparada
+    e o campo que ficou pela metade descartado; o que faltar vem de uma chamada pequena
+    só com esses campos, em vez de gerar tudo de novo. Se ainda faltar algo, RespostaIncompleta."""
+    reparar = truncada(texto)
+    with METRICAS.fase('json'):
+        dados, incompleta = extrair_json(texto, reparar)
+    if reparar:
+        METRICAS.contar('json_reparado', rota, 'truncado')
+        if isinstance(dados, dict): dados.pop(incompleta, None)
+    faltando = campos_faltando(dados, rota)
+    if not faltando:
+        return dados
+    if not isinstance(dados, dict):
+        raise ValueError(f'{rota}: resposta não é um objeto JSON')
+    METRICAS.contar('json_reparado', rota, 'complemento')
+    try:
+        dados.update(completar_campos(rota, faltando, prompt, sistema, ajustes))
+    except Exception as ex:
+        print(f'[{rota}] complemento falhou: {ex!r}')
+    faltando = campos_faltando(dados, rota)
+    if faltando:
+        raise RespostaIncompleta(rota, dados, faltando)
+    return dados
+
+def completar_campos(rota, faltando, prompt, sistema, ajustes=None):
+    """Pede ao modelo só os campos que faltaram, com o mesmo sistema da rota"""
+    esquema    = ESQUEMAS[rota]
+    max_tokens = sum(esquema[c][1] for c in faltando) + 50
+    pedido     = f"""{prompt}
+
+Responda APENAS um objeto JSON só com estes campos, no formato combinado: {', '.join(faltando)}"""
+    extra = ler_json_ia(chamar_ia(pedido, max_tokens=max_tokens, sistema=sistema, rota=rota, ajustes=ajustes))
+    return {c: extra[c] for c in faltando if isinstance(extra, dict) and c in extra}
+
+# ─── sessões de entrevista ───────────────────────────────────────────────────
+
+class SessoesEntrevista:
+    """Transcrição das entrevistas guardada no servidor, por id de sessão: a cada turno o
+    cliente manda só a resposta nova. O SQLite local (EMPREGAAI_SESSOES_DB) faz as vezes
+    de um armazenamento compartilhado."""
+
+    JANELA = 4        # trocas mais recentes que entram literais no prompt
+    RESUMO = 12       # linhas de resumo guardadas (as mais recentes) — o prompt não cresce sem fim
+    TTL    = 6*3600
+
+    def __init__(self, caminho_db):
+        self.caminho_db = caminho_db
+        self._db        = None
+        self._lock      = threading.Lock()
+
+    def _conn(self):
+        if self._db is None:
+            import sqlite3
+            self._db = sqlite3.connect(self.caminho_db, check_same_thread=False, isolation_level=None)
+            self._db.execute('CREATE TABLE IF NOT EXISTS sessoes (id TEXT PRIMARY KEY, dados TEXT, atualizado REAL)')
+        return self._db
+
+    def criar(self, contexto, perguntas, respostas):
+        """Nova sessão, semeada com as trocas que o cliente já tem (ex.: a pergunta de abertura)"""
+        sess = {'id': os.urandom(12).hex(), 'contexto': contexto, 'turnos': [], 'resumo': [], 'pendente': None}
+        for p, r in zip(perguntas, respostas):
+            self._anexar(sess, p, r)
+        if len(perguntas) > len(respostas):
+            sess['pendente'] = perguntas[len(respostas)]
+        with self._lock:
+            self._conn().execute('DELETE FROM sessoes WHERE atualizado < ?', (time.time() - self.TTL,))
+        self.salvar(sess)
+        return sess
+
+    def obter(self, sid):
+        with self._lock:
+            row = self._conn().execute('SELECT dados, atualizado FROM sessoes WHERE id=?', (sid,)).fetchone()
+        if row is None or row[1] < time.time() - self.TTL:
+            return None
+        return json.loads(row[0])
+
+    def salvar(self, sess):
+        with self._lock:
+            self._conn().execute('INSERT OR REPLACE INTO sessoes VALUES (?,?,?)',
+                                 (sess['id'], json.dumps(sess, ensure_ascii=False), time.time()))
+
+    def responder(self, sess, resposta):
+        """Fecha a pergunta pendente com a resposta do candidato (repetir a chamada não duplica)"""
+        if sess['pendente'] is not None:
+            self._anexar(sess, sess['pendente'], resposta)
+            sess['pendente'] = None
+
+    def _anexar(self, sess, pergunta, resposta):
+        turnos = sess['turnos']
+        turnos.append([pergunta, resposta])
+        if len(turnos) > self.JANELA:
+            # a troca que saiu da janela vira uma linha curta no resumo
+            i = len(turnos) - self.JANELA - 1
+            p, r = turnos[i]
+            r = r if len(r) <= 140 else r[:140].rsplit(' ', 1)[0] + '…'
+            sess['resumo'].append(f'P{i+1}: {p} → {r}')
+            del sess['resumo'][:-self.RESUMO]
+
+SESSOES = SessoesEntrevista(os.environ.get('EMPREGAAI_SESSOES_DB', '/tmp/empregaai-sessoes.db'))
+
+def sessao_da_requisicao(dados):
+    """Sessão do corpo — criada se vier 'sessao' vazia, com a 'resposta' nova já registrada.
+    None quando o cliente manda a transcrição inteira (modo antigo)."""
+    if 'sessao' not in dados:
+        return None
+    if not dados['sessao']:
+        contexto = {'modo': dados.get('modo','geral'), 'area': dados.get('area','Administrativo'),
+                    'descricao_vaga': dados.get('descricao_vaga','')}
+        sess = SESSOES.criar(contexto, dados.get('perguntas',[]), dados.get('respostas',[]))
+        dados['sessao'] = sess['id']    # se a rota cair no fallback, ele pega esta em vez de abrir outra
+        return sess
+    sess = SESSOES.obter(dados['sessao'])
+    if sess is None:
+        raise KeyError('Sessão não encontrada')
+    if 'resposta' in dados:
+        SESSOES.responder(sess, dados['resposta'])
+        SESSOES.salvar(sess)
+    return sess
+
+def contexto_entrevista(dados, sess):
+    """(modo, area, descricao_vaga, perguntas, respostas) da sessão ou do corpo"""
+    if sess is not None:
+        ctx = sess['contexto']
+        return (ctx['modo'], ctx['area'], ctx['descricao_vaga'],
+                [p for p, _ in sess['turnos']], [r for _, r in sess['turnos']])
+    return (dados.get('modo','geral'), dados.get('area','Administrativo'), dados.get('descricao_vaga',''),
+            dados.get('perguntas',[]), dados.get('respostas',[]))
+
 # ─── rota: próxima pergunta do simulador ──────────────────────────────────────
 
-def rota_chat(dados):
-    """Gera a próxima pergunta de entrevista"""
-    modo     = dados.get('modo','geral')
-    area     = dados.get('area','Administrativo')
-    desc     = dados.get('descricao_vaga','')
-    perguntas= dados.get('perguntas',[])
-    respostas= dados.get('respostas',[])
-
-    personalidade = {
-        'geral':   'profissional, simpático e encorajador',
-        'vaga':    'focado na vaga específica, técnico e criterioso',
-        'dificil': 'rigoroso, direto, exigente e com pouca paciência para respostas vagas'
-    }.get(modo,'profissional')
+PERSONALIDADES = {
+    'geral':   'profissional, simpático e encorajador',
+    'vaga':    'focado na vaga específica, técnico e criterioso',
+    'dificil': 'rigoroso, direto, exigente e com pouca paciência para respostas vagas'
+}
+
+def prefixo_chat(modo, area, desc):
+    """Parte fixa durante toda a entrevista — vai no bloco de sistema (ver corpo_mensagens)"""
+    return f"""Você é um recrutador {PERSONALIDADES.get(modo,'profissional')} entrevistando para a área de {area}.
+{('Descrição da vaga: '+desc) if desc else ''}
+Regras: apenas a pergunta, máximo 2 frases, não repita perguntas já feitas, sem introduções longas."""
 
+@METRICAS.medir('prompt')
+def prompt_chat(dados, sess=None):
+    """(blocos de sistema, mensagem do usuário) — o prefixo da entrevista é o bloco fixo"""
+    modo, area, desc, perguntas, respostas = contexto_entrevista(dados, sess)
+    resumo = list(sess['resumo']) if sess is not None else []
+    inicio = max(0, len(perguntas) - SESSOES.JANELA) if sess is not None else 0
+    if inicio > len(resumo):
+        resumo.insert(0, f'(P1–P{inicio - len(resumo)} omitidas)')
     hist = ''
-    for i, (p,r) in enumerate(zip(perguntas, respostas)):
+    for i, (p,r) in enumerate(list(zip(perguntas, respostas))[inicio:], inicio):
         hist += f'\nP{i+1}: {p}\nR{i+1}: {r}\n'
+    anteriores = ('\nTrocas anteriores (resumidas):\n' + '\n'.join(resumo) + '\n') if resumo else ''
 
-    prompt = f"""Você é um recrutador {personalidade} entrevistando para a área de {area}.
-{('Descrição da vaga: '+desc) if desc else ''}
-
+    return [prefixo_chat(modo, area, desc)], f"""{anteriores}
 Histórico da entrevista até agora:{hist if hist else ' (início da entrevista)'}
 
-Faça a PRÓXIMA pergunta de entrevista. 
-Regras: apenas a pergunta, máximo 2 frases, não repita perguntas já feitas, sem introduções longas."""
+Faça a PRÓXIMA pergunta de entrevista."""
+
+def resposta_chat(pergunta, sess):
+    if sess is None:
+        return {'pergunta': pergunta}
+    sess['pendente'] = pergunta
+    SESSOES.salvar(sess)
+    return {'pergunta': pergunta, 'sessao': sess['id']}
 
-    pergunta = chamar_ia(prompt, 300)
-    return {'pergunta': pergunta.strip()}
+def rota_chat(dados):
+    """Gera a próxima pergunta de entrevista"""
+    sess     = sessao_da_requisicao(dados)
+    sistema, prompt = prompt_chat(dados, sess)
+    pergunta = chamar_ia(prompt, sistema=sistema, rota='/api/chat', ajustes=dados.get('ia'))
+    return resposta_chat(pergunta.strip(), sess)
 
 # ─── rota: feedback final ────────────────────────────────────────────────────
 
+SISTEMA_FEEDBACK = """Você avalia entrevistas de emprego simuladas; a entrevista completa vem na mensagem.
+
+Gere uma avaliação detalhada e honesta. Responda APENAS JSON válido:
+{"nota":8,"nivel":"Muito bom","resumo":"2-3 frases sobre o desempenho geral específicas para as respostas dadas","fortes":["ponto específico 1","ponto específico 2","ponto específico 3"],"melhorar":["ação concreta 1","ação concreta 2"],"dica":"conselho prático e específico de 2-3 frases baseado nas respostas"}"""
+
 def rota_feedback(dados):
     """Gera avaliação completa da entrevista"""
-    modo     = dados.get('modo','geral')
-    area     = dados.get('area','Administrativo')
-    perguntas= dados.get('perguntas',[])
-    respostas= dados.get('respostas',[])
+    modo, area, _, perguntas, respostas = contexto_entrevista(dados, sessao_da_requisicao(dados))
 
-    hist = ''
-    for i, (p,r) in enumerate(zip(perguntas, respostas)):
-        hist += f'\nPergunta {i+1}: {p}\nResposta {i+1}: {r}\n'
+    with METRICAS.fase('prompt'):
+        hist = ''
+        for i, (p,r) in enumerate(zip(perguntas, respostas)):
+            hist += f'\nPergunta {i+1}: {p}\nResposta {i+1}: {r}\n'
 
-    prompt = f"""Analise esta entrevista de emprego para a área de {area} (modo: {modo}).
+        prompt = f"""Analise esta entrevista de emprego para a área de {area} (modo: {modo}).
 
-ENTREVISTA COMPLETA:{hist}
+ENTREVISTA COMPLETA:{hist}"""
 
-Gere uma avaliação detalhada e honesta. Responda APENAS JSON válido:
-{{"nota":8,"nivel":"Muito bom","resumo":"2-3 frases sobre o desempenho geral específicas para as respostas dadas","fortes":["ponto específico 1","ponto específico 2","ponto específico 3"],"melhorar":["ação concreta 1","ação concreta 2"],"dica":"conselho prático e específico de 2-3 frases baseado nas respostas"}}"""
-
-    text    = chamar_ia(prompt, 600)
-    cleaned = text.replace('```json','').replace('```','').strip()
-    return json.loads(cleaned)
+    texto = chamar_ia(prompt, sistema=[SISTEMA_FEEDBACK], rota='/api/feedback', ajustes=dados.get('ia'))
+    return resposta_validada('/api/feedback', texto, prompt, [SISTEMA_FEEDBACK], dados.get('ia'))
 
 # ─── rota: chance de vaga ─────────────────────────────────────────────────────
 
+# ─── pré-avaliação local (chance) ─────────────────────────────────────────────
+
+TEXTO_STOPWORDS = (
+    'a ao aos as até com como da das de do dos e é em entre na nas no nos o os ou para pela pelas pelo '
+    'pelos por que se sem ser sua suas seu seus um uma uns umas ter tem mais muito bem já não nao sobre '
+    'vaga vagas empresa candidato candidata experiência experiencia conhecimento conhecimentos '
+    'área area será sera buscamos procuramos requisitos desejável desejavel diferencial atividades'
+)
+IDF_GENERICO = 1.0
+
+def radical(t):
+    """Radical grosseiro: organização/organizado/organizar → organi"""
+    return t[:6]
+
+def montar_tabelas_chance():
+    stopwords = frozenset(slug(TEXTO_STOPWORDS).split())
+    # habilidade → idf: o que aparece em muitas áreas (excel, comunicação) discrimina menos
+    df   = collections.Counter(h for _, habs in AREAS.values() for h in set(habs))
+    idf  = {h: 1.0 + math.log(1 + len(AREAS) / n) for h, n in df.items()}
+    area = {h: nome for nome, habs in AREAS.values() for h in habs}
+    # (habilidade, ' palavra palavra ') das frases mais longas para as mais curtas (ver habilidades_em)
+    frases = sorted(((h, ' ' + ' '.join(re.findall(r'[a-z0-9+#]+', h)) + ' ') for h in idf),
+                    key=lambda hf: (-hf[1].count(' '), -len(hf[1])))
+    return stopwords, idf, area, frases
+
+@functools.lru_cache(maxsize=None)
+def tabelas_chance():
+    """(stopwords, idf por habilidade, área da habilidade, frases das habilidades) — na primeira
+    pré-avaliação, ou do snapshot se AREAS e as stopwords não mudaram"""
+    return tabela('chance_frases', repr(AREAS) + TEXTO_STOPWORDS, montar_tabelas_chance)
+
+def tokenizar(txt):
+    stopwords = tabelas_chance()[0]
+    return [radical(t) for t in re.findall(r'[a-z0-9+#]+', slug(txt)) if len(t) > 2 and t not in stopwords]
+
+def habilidades_em(txt):
+    """Habilidades do dicionário citadas no texto como frase inteira, das mais longas para as
+    mais curtas: 'fluxo de caixa' consome o 'caixa', 'redes sociais' o 'redes' — e 'paciente'
+    não vira 'paciencia' nem 'agendamento' vira 'agenda'"""
+    texto, achadas = ' ' + ' '.join(re.findall(r'[a-z0-9+#]+', slug(txt))) + ' ', set()
+    for h, frase in tabelas_chance()[3]:
+        if frase in texto:
+            achadas.add(h)
+            texto = texto.replace(frase, ' | ')
+    return achadas
+
+def pontuar_local(perfil, vaga, k1=1.2):
+    """Compatibilidade perfil × vaga sem o modelo, no estilo BM25: cada termo da vaga pesa
+    pelo idf (habilidades do dicionário de AREAS pesam mais) e satura com a frequência no perfil.
+    Devolve o resultado no formato de rota_chance, mais os termos em comum e faltantes."""
+    _, idf, habilidade_area, _ = tabelas_chance()
+    hab_vaga, hab_perfil = habilidades_em(vaga), habilidades_em(perfil)
+    tf_perfil = collections.Counter(tokenizar(perfil))
+    termos    = {t: IDF_GENERICO for t in tokenizar(vaga)}
+    termos.update({h: 2 * idf[h] for h in hab_vaga})
+    obtido = 0.0
+    for t, peso in termos.items():
+        tf = tf_perfil.get(t, 0) or (1 if t in hab_perfil else 0)
+        obtido += peso * tf * (k1 + 1) / (tf + k1)      # = peso quando tf=1, satura acima
+    cobertura = min(1.0, obtido / (sum(termos.values()) or 1.0))
+
+    comuns   = sorted(hab_vaga & hab_perfil, key=lambda h: -idf[h])
+    faltando = sorted(hab_vaga - hab_perfil, key=lambda h: -idf[h])
+    areas_vaga   = {habilidade_area[h] for h in hab_vaga} - {'Outro'}
+    areas_perfil = {habilidade_area[h] for h in hab_perfil} - {'Outro'}
+    bonus_area   = 5 if areas_vaga & areas_perfil else 0
+    pct = max(5, min(95, round(20 + 75 * cobertura + bonus_area)))
+    nivel = ('Muito compatível' if pct >= 75 else 'Compatível' if pct >= 55
+             else 'Parcialmente compatível' if pct >= 35 else 'Pouco compatível')
+    return {
+        'porcentagem': pct, 'nivel': nivel,
+        'sub': (f'Você cobre {len(comuns)} de {len(hab_vaga)} habilidades pedidas na vaga.' if hab_vaga
+                else 'A vaga não lista habilidades específicas — destaque sua disposição para aprender.'),
+        'pontos_fortes':   [f'Você já tem {h}' for h in comuns[:3]] or ['Interesse em atuar na área da vaga'],
+        'pontos_melhorar': [f'Desenvolva {h} (pedido na vaga)' for h in faltando[:3]]
+                           or ['Adapte o currículo com as palavras-chave da vaga'],
+        'origem': 'local', 'comuns': comuns, 'faltando': faltando,
+    }
+
+VAGA_MAX_CHARS = 2500   # acima disso, só as linhas com termos relevantes vão ao modelo
+
+def resumir_vaga(vaga, local):
+    if len(vaga) <= VAGA_MAX_CHARS:
+        return vaga
+    chaves = set(local['comuns']) | set(local['faltando'])
+    linhas = [l for l in vaga.splitlines() if l.strip()]
+    manter = [l for i, l in enumerate(linhas) if i < 3 or habilidades_em(l) & chaves]
+    return '\n'.join(manter)[:VAGA_MAX_CHARS]
+
+SISTEMA_CHANCE = """Você é especialista em recrutamento e seleção. Analise a compatibilidade entre a vaga e o candidato descritos na mensagem.
+
+Seja honesto e específico. Responda APENAS JSON válido:
+{"porcentagem":72,"nivel":"Compatível","sub":"frase resumindo a compatibilidade","pontos_fortes":["aspecto específico 1","aspecto específico 2","aspecto específico 3"],"pontos_melhorar":["ação concreta 1","ação concreta 2","ação concreta 3"]}"""
+
 def rota_chance(dados):
-    """Calcula compatibilidade candidato × vaga"""
+    """Calcula compatibilidade candidato × vaga. modo 'rapido' responde só com a pré-avaliação
+    local; nos demais o modelo avalia, com a pré-avaliação no prompt."""
     vaga   = dados.get('vaga','')
     perfil = dados.get('perfil','')
 
-    prompt = f"""Você é especialista em recrutamento e seleção. Analise a compatibilidade.
+    local = pontuar_local(perfil, vaga)
+    modo  = dados.get('modo')
+    if modo == 'rapido':
+        return {k: local[k] for k in ('porcentagem','nivel','sub','pontos_fortes','pontos_melhorar','origem')}
 
-DESCRIÇÃO DA VAGA:
-{vaga}
+    with METRICAS.fase('prompt'):
+        prompt = f"""DESCRIÇÃO DA VAGA:
+{resumir_vaga(vaga, local)}
 
 PERFIL DO CANDIDATO:
 {perfil if perfil else 'Candidato em início de carreira sem experiência formal definida.'}
 
-Seja honesto e específico. Responda APENAS JSON válido:
-{{"porcentagem":72,"nivel":"Compatível","sub":"frase resumindo a compatibilidade","pontos_fortes":["aspecto específico 1","aspecto específico 2","aspecto específico 3"],"pontos_melhorar":["ação concreta 1","ação concreta 2","ação concreta 3"]}}"""
+PRÉ-ANÁLISE (automática): habilidades em comum: {', '.join(local['comuns']) or 'nenhuma'}; pedidas e ausentes no perfil: {', '.join(local['faltando']) or 'nenhuma'}."""
+
+    return chamar_ia_cache(prompt, lambda t: resposta_validada('/api/chance', t, prompt, [SISTEMA_CHANCE], dados.get('ia')),
+                           sistema=[SISTEMA_CHANCE], rota='/api/chance', ajustes=dados.get('ia'))
+
+# ─── rota: chance em lote ─────────────────────────────────────────────────────
+
+LOTE_MAX         = int(os.environ.get('EMPREGAAI_LOTE_MAX', 20))   # vagas por requisição
+LOTE_POR_CHAMADA = 5                                                # vagas por prompt
+LOTE_PARALELO    = 4                                                # prompts simultâneos por requisição
+
+SISTEMA_CHANCE_LOTE = """Você é especialista em recrutamento e seleção. Analise a compatibilidade do candidato com CADA uma das vagas numeradas na mensagem, independentemente.
+
+Seja honesto e específico. Responda APENAS JSON válido, com um item por vaga na mesma ordem:
+{"resultados":[{"vaga":1,"porcentagem":72,"nivel":"Compatível","sub":"frase resumindo a compatibilidade","pontos_fortes":["aspecto específico 1","aspecto específico 2","aspecto específico 3"],"pontos_melhorar":["ação concreta 1","ação concreta 2","ação concreta 3"]}]}"""
+
+def chave_chance_vaga(perfil, vaga):
+    """Resultado de cada vaga fica no CACHE para que lotes seguintes pulem vagas já avaliadas"""
+    return CacheRespostas.chave(perfil + '\x00' + vaga, 'chance-vaga', '')
+
+def avaliar_lote(perfil, vagas, ajustes=None):
+    """Uma chamada para até LOTE_POR_CHAMADA vagas; devolve um resultado por vaga, None na
+    vaga que o modelo deixou sem porcentagem"""
+    with METRICAS.fase('prompt'):
+        blocos = ''.join(f'\n\nVAGA {i+1}:\n{v}' for i, v in enumerate(vagas))
+        prompt = f"""PERFIL DO CANDIDATO:
+{perfil if perfil else 'Candidato em início de carreira sem experiência formal definida.'}{blocos}"""
+    texto   = chamar_ia(prompt, max_tokens=450*len(vagas), sistema=[SISTEMA_CHANCE_LOTE],
+                        rota='/api/chance/lote', ajustes=ajustes)
+    reparar = truncada(texto)
+    with METRICAS.fase('json'):
+        ia, _ = extrair_json(texto, reparar)
+    itens = ia['resultados'] if isinstance(ia, dict) else ia
+    if reparar:
+        itens = itens[:-1]          # a última vaga pode ter sido cortada no meio: vai para o fallback
+    por_numero = {item.get('vaga'): item for item in itens if isinstance(item, dict)}
+    resultados = []
+    for i in range(len(vagas)):
+        item = por_numero.get(i+1) or (itens[i] if i < len(itens) else None)
+        ok   = isinstance(item, dict) and isinstance(item.get('porcentagem'), NUM)
+        resultados.append({k: v for k, v in item.items() if k != 'vaga'} if ok else None)
+    return resultados
+
+def rota_chance_lote(dados):
+    """Um perfil × até LOTE_MAX vagas, devolvidas da mais para a menos compatível"""
+    perfil = dados.get('perfil','')
+    vagas  = [v for v in dados.get('vagas',[]) if isinstance(v, str) and v.strip()][:LOTE_MAX]
+    if not vagas:
+        return {'erro': 'Nenhuma vaga informada'}
+
+    resultados, pendentes = [None]*len(vagas), []
+    for i, vaga in enumerate(vagas):
+        salvo = CACHE.obter(chave_chance_vaga(perfil, vaga))
+        if salvo is not None: resultados[i] = json.loads(salvo)
+        else:                 pendentes.append(i)
+    do_cache = len(vagas) - len(pendentes)
+
+    lotes = [pendentes[k:k+LOTE_POR_CHAMADA] for k in range(0, len(pendentes), LOTE_POR_CHAMADA)]
+    def avaliar(idx):
+        try:
+            return avaliar_lote(perfil, [vagas[i] for i in idx], dados.get('ia'))
+        except Exception as ex:
+            print(f'[/api/chance/lote] lote de {len(idx)} vagas falhou: {ex} — usando fallback')
+            METRICAS.contar('fallbacks', '/api/chance/lote', 'lote')
+            return None
+    for k in range(0, len(lotes), LOTE_PARALELO):
+        onda = lotes[k:k+LOTE_PARALELO]
+        for idx, res in zip(onda, executor().map(METRICAS.na_rota(avaliar), onda) if len(onda) > 1 else map(avaliar, onda)):
+            for i, r in zip(idx, res or [None]*len(idx)):
+                if r is None:
+                    if res: METRICAS.contar('fallbacks', '/api/chance/lote', 'vaga')
+                    resultados[i] = fallback_chance(dados)
+                    continue
+                resultados[i] = r
+                CACHE.guardar(chave_chance_vaga(perfil, vagas[i]), json.dumps(r, ensure_ascii=False))
+
+    ranking = [dict(r, indice=i) for i, r in enumerate(resultados)]
+    ranking.sort(key=lambda r: r.get('porcentagem') if isinstance(r.get('porcentagem'), (int, float)) else 0, reverse=True)
+    return {'resultados': ranking, 'do_cache': do_cache}
+
+# ─── modelos HTML ─────────────────────────────────────────────────────────────
+
+class ModeloHTML:
+    """Modelo compilado (como ModeloURL) numa f-string: pedaços estáticos + slots, no primeiro
+    uso. {{campo}} sai com escape HTML; {{{campo}}} entra cru (HTML já montado/confiável).
+    compactar=True tira as quebras de linha e a indentação dos pedaços estáticos."""
+
+    SLOT = r'(\{\{\{\w+\}\}\}|\{\{\w+\}\})'
+
+    def __init__(self, texto, compactar=False):
+        self.fonte, self.compactar = texto, compactar
+
+    @functools.cached_property
+    def compilado(self):
+        fonte, campos = [], []
+        for i, p in enumerate(re.split(self.SLOT, self.fonte)):
+            if i % 2:
+                campo = p.strip('{}')
+                campos.append(campo)
+                fonte.append('{' + (campo if p.startswith('{{{') else f'_esc({campo})') + '}')
+            elif p:
+                fonte.append((re.sub(r'\n\s*', '', p) if self.compactar else p).replace('{', '{{').replace('}', '}}'))
+        args = ', '.join(('_esc',) + tuple(dict.fromkeys(campos)))
+        return compilar(f'lambda {args}: f' + repr(''.join(fonte)))
+
+    @staticmethod
+    def escapar(v):
+        v = str(v)
+        return html.escape(v, quote=False) if '<' in v or '>' in v or '&' in v else v
+
+    def texto(self, **valores):
+        return self.compilado(self.escapar, **valores)
+
+MODELO_CV = ModeloHTML("""<div class="cv-header-info">
+  <div class="cv-name">{{nome}}</div>
+  <div class="cv-role">Profissional em Início de Carreira | {{area}}</div>
+  <div class="cv-contact-line">📍 {{cidade}} &nbsp;·&nbsp; ✉️ {{email}} &nbsp;·&nbsp; 📱 {{tel}}</div>
+</div>
+<div class="cv-divider"></div>
+<div class="cv-sec"><div class="cv-sec-title">Objetivo Profissional</div></div>
+<div class="cv-body">Busco minha primeira oportunidade em {{area}} para desenvolver habilidades e contribuir com resultados positivos. {{obj}} Tenho grande disposição para aprender, crescer e superar desafios com dedicação e comprometimento.</div>
+<div class="cv-sec"><div class="cv-sec-title">Formação Acadêmica</div></div>
+<div class="cv-body"><strong>{{formacao}}</strong></div>
+<div class="cv-sec"><div class="cv-sec-title">Competências e Habilidades</div></div>
+<div class="cv-skills-wrap">{{{chips}}}</div>
+<div class="cv-sec"><div class="cv-sec-title">Experiências Complementares</div></div>
+<div class="cv-body">{{{exp_html}}}</div>
+<div class="cv-sec"><div class="cv-sec-title">Sobre Mim</div></div>
+<div class="cv-body">{{sobre}} Comprometido com meu desenvolvimento profissional, com facilidade para trabalho em equipe, comunicação clara e boa capacidade de adaptação.</div>""")
 
-    text    = chamar_ia(prompt, 500)
-    cleaned = text.replace('```json','').replace('```','').strip()
-    return json.loads(cleaned)
+MODELO_EMAIL = ModeloHTML("""<!DOCTYPE html>
+<html><head><meta charset="UTF-8">
+<style>
+  body{font-family:'Helvetica Neue',Arial,sans-serif;background:#f5ede0;margin:0;padding:0;}
+  .wrap{max-width:640px;margin:0 auto;background:#fff;border-radius:16px;overflow:hidden;}
+  .header{background:#1a0f06;padding:32px 40px;text-align:center;}
+  .logo{font-size:22px;font-weight:900;color:#fff;letter-spacing:-0.5px;}
+  .logo span{color:#e8521a;}
+  .badge{display:inline-block;background:rgba(232,82,26,.15);border:1px solid rgba(232,82,26,.3);
+    border-radius:100px;padding:6px 16px;font-size:12px;font-weight:700;color:#f4a935;
+    margin-top:10px;letter-spacing:1px;text-transform:uppercase;}
+  .body{padding:36px 40px;}
+  .greeting{font-size:22px;font-weight:900;color:#1a0f06;margin-bottom:8px;}
+  .intro{font-size:15px;color:#6b5e4a;line-height:1.6;margin-bottom:28px;}
+  .cv-box{background:#fdf8f0;border:1px solid #e8dfd0;border-radius:12px;padding:28px;margin-bottom:24px;}
+  .cv-box h2{font-size:12px;font-weight:800;color:#e8521a;letter-spacing:1.5px;text-transform:uppercase;margin-bottom:16px;}
+  .cv-name{font-size:24px;font-weight:900;color:#1a0f06;margin-bottom:4px;}
+  .cv-role{font-size:13px;color:#9a8e7e;margin-bottom:12px;}
+  .cv-sec-title{font-size:9px;font-weight:800;letter-spacing:2.5px;text-transform:uppercase;
+    color:#e8521a;padding-bottom:4px;border-bottom:1px solid #ede8df;margin:14px 0 6px;}
+  .cv-body{font-size:13px;color:#3a3020;line-height:1.7;}
+  .cv-bullet{font-size:13px;color:#3a3020;padding:2px 0 2px 12px;text-indent:-12px;}
+  .skill-tag{display:inline-block;background:#ede8df;border:1px solid #d4cdc0;border-radius:100px;
+    padding:3px 10px;font-size:11px;font-weight:600;color:#4a3f2f;margin:2px;}
+  .section-title{font-size:12px;font-weight:800;color:#9a8e7e;letter-spacing:1px;text-transform:uppercase;margin-bottom:12px;}
+  .extra-box{background:#f5ede0;border-radius:12px;padding:20px;margin-bottom:16px;font-size:13px;color:#3a3020;line-height:1.7;white-space:pre-line;}
+  .cta{background:#e8521a;color:#fff;display:block;text-align:center;padding:16px;border-radius:12px;
+    font-size:16px;font-weight:800;text-decoration:none;margin:28px 0 8px;}
+  .footer{background:#1a0f06;padding:20px 40px;text-align:center;font-size:12px;color:rgba(255,255,255,.4);}
+</style></head><body>
+<div class="wrap">
+  <div class="header">
+    <div class="logo">Emprega<span>AI</span></div>
+    <div class="badge">✦ Seu currículo está pronto</div>
+  </div>
+  <div class="body">
+    <div class="greeting">Parabéns, {{nome}}! 🎉</div>
+    <div class="intro">Seu currículo profissional foi gerado com sucesso. Aqui está tudo que você precisa para começar a aplicar para vagas hoje mesmo.</div>
+
+    <div class="cv-box">
+      <h2>📄 Seu Currículo</h2>
+      {{{cv_html}}}
+    </div>
+
+    <div class="section-title">🔗 Seu Perfil LinkedIn</div>
+    <div class="extra-box">{{linkedin}}</div>
+
+    <div class="section-title">📧 Email de Candidatura Pronto</div>
+    <div class="extra-box">{{email_cand}}</div>
+
+    <a href="https://empregaai-mu.vercel.app" class="cta">🚀 Acessar EmpregaAI Plus →</a>
+    <div style="font-size:12px;color:#9a8e7e;text-align:center;">Dúvidas? Responda este email que te ajudamos.</div>
+  </div>
+  <div class="footer">EmpregaAI © 2025 · Feito com ❤️ e IA para quem está começando</div>
+</div>
+</body></html>""", compactar=True)
 
 # ─── fallbacks (sem API) ─────────────────────────────────────────────────────
 
@@ -233,31 +1860,17 @@ def fallback_gerar(dados):
     email   = dados.get('email','')
     formacao= esc+(' — '+ano if ano else '')
     hab1    = habs.split(',')[0].strip()
-    chips   = ''.join(f'<span class="cv-skill-tag">{h.strip()}</span>' for h in habs.split(',') if h.strip())
+    chips   = ''.join(f'<span class="cv-skill-tag">{html.escape(h.strip())}</span>' for h in habs.split(',') if h.strip())
     exp_html= ''
     exp = dados.get('experiencias','')
     if exp and exp.strip():
         for l in exp.replace(';','\n').split('\n'):
-            if l.strip(): exp_html += f'<div class="cv-bullet">• {l.strip()}</div>'
+            if l.strip(): exp_html += f'<div class="cv-bullet">• {html.escape(l.strip())}</div>'
     else:
         exp_html = '<div class="cv-bullet">• Iniciando trajetória profissional com disposição para aprender e contribuir.</div>'
 
-    cv_html = f"""<div class="cv-header-info">
-  <div class="cv-name">{nome.upper()}</div>
-  <div class="cv-role">Profissional em Início de Carreira | {area}</div>
-  <div class="cv-contact-line">📍 {cidade} &nbsp;·&nbsp; ✉️ {email} &nbsp;·&nbsp; 📱 {tel}</div>
-</div>
-<div class="cv-divider"></div>
-<div class="cv-sec"><div class="cv-sec-title">Objetivo Profissional</div></div>
-<div class="cv-body">Busco minha primeira oportunidade em {area} para desenvolver habilidades e contribuir com resultados positivos. {obj} Tenho grande disposição para aprender, crescer e superar desafios com dedicação e comprometimento.</div>
-<div class="cv-sec"><div class="cv-sec-title">Formação Acadêmica</div></div>
-<div class="cv-body"><strong>{formacao}</strong></div>
-<div class="cv-sec"><div class="cv-sec-title">Competências e Habilidades</div></div>
-<div class="cv-skills-wrap">{chips}</div>
-<div class="cv-sec"><div class="cv-sec-title">Experiências Complementares</div></div>
-<div class="cv-body">{exp_html}</div>
-<div class="cv-sec"><div class="cv-sec-title">Sobre Mim</div></div>
-<div class="cv-body">{sobre} Comprometido com meu desenvolvimento profissional, com facilidade para trabalho em equipe, comunicação clara e boa capacidade de adaptação.</div>"""
+    cv_html = MODELO_CV.texto(nome=nome.upper(), area=area, cidade=cidade, email=email, tel=tel,
+                              obj=obj, formacao=formacao, sobre=sobre, chips=chips, exp_html=exp_html)
 
     return {
         'cv_html': cv_html,
@@ -289,14 +1902,20 @@ FALLBACK_PERGUNTAS = {
 }
 
 def fallback_chat(dados):
-    modo     = dados.get('modo','geral')
-    respostas= dados.get('respostas',[])
+    try:
+        sess = sessao_da_requisicao(dados)
+    except KeyError:
+        return {'erro': 'Sessão não encontrada'}    # o cliente recomeça mandando a transcrição
+    modo, _, _, _, respostas = contexto_entrevista(dados, sess)
     idx      = len(respostas) % len(FALLBACK_PERGUNTAS.get(modo, FALLBACK_PERGUNTAS['geral']))
     pergunta = FALLBACK_PERGUNTAS.get(modo, FALLBACK_PERGUNTAS['geral'])[idx]
-    return {'pergunta': pergunta}
+    return resposta_chat(pergunta, sess)
 
 def fallback_feedback(dados):
-    respostas = dados.get('respostas',[])
+    try:
+        respostas = contexto_entrevista(dados, sessao_da_requisicao(dados))[4]
+    except KeyError:
+        return {'erro': 'Sessão não encontrada'}    # idem fallback_chat: não dá para dar nota sem as respostas
     nota = min(10, max(4, sum(1 for r in respostas if len(r)>40)*2 + 2))
     return {
         'nota': nota, 'nivel': 'Bom trabalho' if nota>=6 else 'Continue praticando',
@@ -306,6 +1925,10 @@ def fallback_feedback(dados):
         'dica': 'Pratique responder em voz alta para ganhar fluidez e confiança nas entrevistas.'
     }
 
+def fallback_chance_lote(dados):
+    vagas = [v for v in dados.get('vagas',[]) if isinstance(v, str) and v.strip()][:LOTE_MAX]
+    return {'resultados': [dict(fallback_chance(dados), indice=i) for i in range(len(vagas))], 'do_cache': 0}
+
 def fallback_chance(dados):
     return {
         'porcentagem': 65, 'nivel': 'Compatível',
@@ -316,6 +1939,177 @@ def fallback_chance(dados):
 
 # ─── email ────────────────────────────────────────────────────────────────────
 
+class FilaEmails:
+    """Caixa de saída durável: /api/email só enfileira e uma thread da instância manda em
+    lotes pelo /emails/batch do Resend, com novas tentativas em backoff exponencial. O que
+    esgota as tentativas (ou o Resend recusa) fica como 'falhou' — a lista de mortos. O
+    SQLite local (EMPREGAAI_EMAILS_DB) faz as vezes de um armazenamento compartilhado."""
+
+    LOTE           = 100      # máximo do /emails/batch
+    JANELA         = 0.25     # s esperando mais emails antes de mandar o lote
+    MAX_TENTATIVAS = 6
+    BACKOFF_BASE   = 2.0      # s; dobra a cada tentativa, com jitter
+    BACKOFF_MAX    = 300.0
+    TIMEOUT        = 15
+    TTL            = 7*24*3600
+
+    def __init__(self, caminho_db):
+        self.caminho_db = caminho_db
+        self._db        = None
+        self._lock      = threading.Lock()
+        self._acordar   = threading.Event()
+        self._thread    = None
+
+    def _conn(self):
+        if self._db is None:
+            import sqlite3
+            self._db = sqlite3.connect(self.caminho_db, check_same_thread=False, isolation_level=None)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS emails (id TEXT PRIMARY KEY, estado TEXT, tentativas INTEGER, '
+                             'proxima REAL, mensagem TEXT, erro TEXT, resend_id TEXT, criado REAL, atualizado REAL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS emails_fila ON emails (estado, proxima)')
+            # lote que estava no ar quando a instância anterior morreu volta para a fila
+            self._db.execute("UPDATE emails SET estado='pendente' WHERE estado='enviando'")
+        return self._db
+
+    def enfileirar(self, mensagem):
+        """Guarda a mensagem (corpo do Resend) e devolve o id para GET /api/email/status"""
+        mid, agora = os.urandom(12).hex(), time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute("DELETE FROM emails WHERE estado IN ('enviado','falhou') AND atualizado < ?", (agora - self.TTL,))
+            db.execute("INSERT INTO emails VALUES (?,'pendente',0,?,?,NULL,NULL,?,?)",
+                       (mid, agora, json.dumps(mensagem, ensure_ascii=False), agora, agora))
+        self.iniciar()
+        self._acordar.set()
+        return mid
+
+    def status(self, mid):
+        with self._lock:
+            row = self._conn().execute('SELECT estado, tentativas, erro, resend_id, criado, atualizado '
+                                       'FROM emails WHERE id=?', (mid,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('estado', 'tentativas', 'erro', 'resend_id', 'criado', 'atualizado'), row), id=mid)
+
+    def estatisticas(self, mortos=20):
+        """Contagem por estado e os últimos que falharam de vez"""
+        with self._lock:
+            db = self._conn()
+            contagem = dict(db.execute('SELECT estado, COUNT(*) FROM emails GROUP BY estado').fetchall())
+            falhas   = db.execute("SELECT id, tentativas, erro, atualizado FROM emails WHERE estado='falhou' "
+                                  'ORDER BY atualizado DESC LIMIT ?', (mortos,)).fetchall()
+        return {'estados': contagem,
+                'mortos': [dict(zip(('id', 'tentativas', 'erro', 'atualizado'), f)) for f in falhas]}
+
+    def reenviar(self, mid):
+        """Devolve um email morto para a fila (tentativas zeradas)"""
+        with self._lock:
+            n = self._conn().execute("UPDATE emails SET estado='pendente', tentativas=0, proxima=?, erro=NULL "
+                                     "WHERE id=? AND estado='falhou'", (time.time(), mid)).rowcount
+        if n:
+            self.iniciar()
+            self._acordar.set()
+        return bool(n)
+
+    # ── worker ──
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._rodar, name='fila-emails', daemon=True)
+                self._thread.start()
+
+    def _rodar(self):
+        while True:
+            try:
+                self._acordar.wait(self._ate_proxima())
+                self._acordar.clear()
+                time.sleep(self.JANELA)
+                while self.processar():
+                    pass
+            except Exception as ex:
+                # o worker não pode morrer: o que ficasse 'enviando' só voltaria ao reiniciar a instância
+                print(f'[fila-emails] rodada falhou: {ex!r}')
+                time.sleep(self.BACKOFF_BASE)
+
+    def _ate_proxima(self):
+        with self._lock:
+            (proxima,) = self._conn().execute("SELECT MIN(proxima) FROM emails WHERE estado='pendente'").fetchone()
+        return 60.0 if proxima is None else min(60.0, max(0.0, proxima - time.time()))
+
+    def processar(self):
+        """Manda um lote do que já está na hora; devolve quantos saíram da fila nesta rodada"""
+        with self._lock:
+            db   = self._conn()
+            lote = db.execute("SELECT id, tentativas, mensagem FROM emails WHERE estado='pendente' AND proxima <= ? "
+                              'ORDER BY criado LIMIT ?', (time.time(), self.LOTE)).fetchall()
+            db.executemany("UPDATE emails SET estado='enviando' WHERE id=?", [(mid,) for mid, _, _ in lote])
+        if lote:
+            try:
+                self._enviar(lote)
+            except Exception as ex:
+                self._devolver(lote, f'{type(ex).__name__}: {ex}'[:300])
+        return len(lote)
+
+    def _devolver(self, lote, erro):
+        """Erro inesperado no meio do envio: o que ainda está 'enviando' volta para a fila com
+        uma tentativa a mais (o que já foi marcado na separação do lote fica como está)"""
+        with self._lock:
+            ainda = {mid for (mid,) in self._conn().execute(
+                "SELECT id FROM emails WHERE estado='enviando' AND id IN (%s)" % ','.join('?' * len(lote)),
+                [mid for mid, _, _ in lote])}
+        self._adiar([item for item in lote if item[0] in ainda], erro)
+
+    def _enviar(self, lote):
+        import hashlib
+        resend_key = os.environ.get('RESEND_API_KEY', 're_MkDTntJv_9XrUiCTJ4BmEfyVDcsXjoXQ8')
+        headers    = {'Authorization': f'Bearer {resend_key}',
+                      # o mesmo lote repetido depois de um timeout não sai duas vezes
+                      'Idempotency-Key': hashlib.sha256(''.join(mid for mid, _, _ in lote).encode()).hexdigest()[:48]}
+        try:
+            resp = post_json(url_base('resend') + '/emails/batch', [json.loads(m) for _, _, m in lote],
+                             headers, timeout=self.TIMEOUT)
+            ids  = [d.get('id') for d in resp.get('data', [])]
+        except ErroHTTP as e:
+            if e.status == 429 or e.status >= 500:
+                self._adiar(lote, f'HTTP {e.status}', retry_after(e))
+            elif len(lote) > 1:
+                # o batch recusa o lote inteiro se uma mensagem é inválida: separa para achar qual
+                for item in lote:
+                    self._enviar([item])
+            else:
+                self._marcar(lote, 'falhou', erro=f'HTTP {e.status}: {e.corpo[:300]}')
+            return
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            self._adiar(lote, f'{type(e).__name__}: {e}'[:300])
+            return
+        self._marcar(lote, 'enviado', ids=ids)
+
+    def _adiar(self, lote, erro, espera=None):
+        agora = time.time()
+        with self._lock:
+            db = self._conn()
+            for mid, tentativas, _ in lote:
+                tentativas += 1
+                if tentativas >= self.MAX_TENTATIVAS:
+                    db.execute("UPDATE emails SET estado='falhou', tentativas=?, erro=?, atualizado=? WHERE id=?",
+                               (tentativas, erro, agora, mid))
+                    continue
+                atraso = espera or min(self.BACKOFF_MAX, self.BACKOFF_BASE * 2 ** (tentativas - 1)) * random.uniform(0.5, 1)
+                db.execute("UPDATE emails SET estado='pendente', tentativas=?, proxima=?, erro=?, atualizado=? WHERE id=?",
+                           (tentativas, agora + atraso, erro, agora, mid))
+
+    def _marcar(self, lote, estado, erro=None, ids=()):
+        agora = time.time()
+        ids   = list(ids) + [None] * (len(lote) - len(ids))
+        with self._lock:
+            self._conn().executemany('UPDATE emails SET estado=?, tentativas=tentativas+1, erro=?, resend_id=?, '
+                                     'atualizado=? WHERE id=?',
+                                     [(estado, erro, rid, agora, mid) for (mid, _, _), rid in zip(lote, ids)])
+
+EMAILS = FilaEmails(os.environ.get('EMPREGAAI_EMAILS_DB', '/tmp/empregaai-emails.db'))
+
 def rota_email(dados):
     email     = dados.get('email','').strip()
     nome      = dados.get('nome','Candidato').strip()
@@ -326,87 +2120,68 @@ def rota_email(dados):
     if not email:
         return {'erro': 'Email não informado'}
 
-    resend_key = os.environ.get('RESEND_API_KEY', 're_MkDTntJv_9XrUiCTJ4BmEfyVDcsXjoXQ8')
-
-    html_email = f"""<!DOCTYPE html>
-<html><head><meta charset="UTF-8">
-<style>
-  body{{font-family:'Helvetica Neue',Arial,sans-serif;background:#f5ede0;margin:0;padding:0;}}
-  .wrap{{max-width:640px;margin:0 auto;background:#fff;border-radius:16px;overflow:hidden;}}
-  .header{{background:#1a0f06;padding:32px 40px;text-align:center;}}
-  .logo{{font-size:22px;font-weight:900;color:#fff;letter-spacing:-0.5px;}}
-  .logo span{{color:#e8521a;}}
-  .badge{{display:inline-block;background:rgba(232,82,26,.15);border:1px solid rgba(232,82,26,.3);
-    border-radius:100px;padding:6px 16px;font-size:12px;font-weight:700;color:#f4a935;
-    margin-top:10px;letter-spacing:1px;text-transform:uppercase;}}
-  .body{{padding:36px 40px;}}
-  .greeting{{font-size:22px;font-weight:900;color:#1a0f06;margin-bottom:8px;}}
-  .intro{{font-size:15px;color:#6b5e4a;line-height:1.6;margin-bottom:28px;}}
-  .cv-box{{background:#fdf8f0;border:1px solid #e8dfd0;border-radius:12px;padding:28px;margin-bottom:24px;}}
-  .cv-box h2{{font-size:12px;font-weight:800;color:#e8521a;letter-spacing:1.5px;text-transform:uppercase;margin-bottom:16px;}}
-  .cv-name{{font-size:24px;font-weight:900;color:#1a0f06;margin-bottom:4px;}}
-  .cv-role{{font-size:13px;color:#9a8e7e;margin-bottom:12px;}}
-  .cv-sec-title{{font-size:9px;font-weight:800;letter-spacing:2.5px;text-transform:uppercase;
-    color:#e8521a;padding-bottom:4px;border-bottom:1px solid #ede8df;margin:14px 0 6px;}}
-  .cv-body{{font-size:13px;color:#3a3020;line-height:1.7;}}
-  .cv-bullet{{font-size:13px;color:#3a3020;padding:2px 0 2px 12px;text-indent:-12px;}}
-  .skill-tag{{display:inline-block;background:#ede8df;border:1px solid #d4cdc0;border-radius:100px;
-    padding:3px 10px;font-size:11px;font-weight:600;color:#4a3f2f;margin:2px;}}
-  .section-title{{font-size:12px;font-weight:800;color:#9a8e7e;letter-spacing:1px;text-transform:uppercase;margin-bottom:12px;}}
-  .extra-box{{background:#f5ede0;border-radius:12px;padding:20px;margin-bottom:16px;font-size:13px;color:#3a3020;line-height:1.7;white-space:pre-line;}}
-  .cta{{background:#e8521a;color:#fff;display:block;text-align:center;padding:16px;border-radius:12px;
-    font-size:16px;font-weight:800;text-decoration:none;margin:28px 0 8px;}}
-  .footer{{background:#1a0f06;padding:20px 40px;text-align:center;font-size:12px;color:rgba(255,255,255,.4);}}
-</style></head><body>
-<div class="wrap">
-  <div class="header">
-    <div class="logo">Emprega<span>AI</span></div>
-    <div class="badge">✦ Seu currículo está pronto</div>
-  </div>
-  <div class="body">
-    <div class="greeting">Parabéns, {nome}! 🎉</div>
-    <div class="intro">Seu currículo profissional foi gerado com sucesso. Aqui está tudo que você precisa para começar a aplicar para vagas hoje mesmo.</div>
-
-    <div class="cv-box">
-      <h2>📄 Seu Currículo</h2>
-      {cv_html}
-    </div>
-
-    <div class="section-title">🔗 Seu Perfil LinkedIn</div>
-    <div class="extra-box">{linkedin}</div>
-
-    <div class="section-title">📧 Email de Candidatura Pronto</div>
-    <div class="extra-box">{email_cand}</div>
-
-    <a href="https://empregaai-mu.vercel.app" class="cta">🚀 Acessar EmpregaAI Plus →</a>
-    <div style="font-size:12px;color:#9a8e7e;text-align:center;">Dúvidas? Responda este email que te ajudamos.</div>
-  </div>
-  <div class="footer">EmpregaAI © 2025 · Feito com ❤️ e IA para quem está começando</div>
-</div>
-</body></html>"""
-
-    body = json.dumps({
-        'from':    'EmpregaAI <onboarding@resend.dev>',
-        'to':      [email],
-        'subject': f'🎉 {nome}, seu currículo profissional está aqui!',
-        'html':    html_email
-    }).encode('utf-8')
-
-    req = urllib.request.Request(
-        'https://api.resend.com/emails',
-        data=body,
-        headers={
-            'Authorization': f'Bearer {resend_key}',
-            'Content-Type':  'application/json'
-        }
-    )
+    html_email = MODELO_EMAIL.texto(nome=nome, cv_html=cv_html, linkedin=linkedin, email_cand=email_cand)
+
+    mid = EMAILS.enfileirar({'from':    'EmpregaAI <onboarding@resend.dev>',
+                             'to':      [email],
+                             'subject': f'🎉 {nome}, seu currículo profissional está aqui!',
+                             'html':    html_email})
+    return {'ok': True, 'id': mid, 'estado': 'pendente'}
+
+def status_email(query):
+    """?id=… → estado de um email; sem id → só a contagem por estado. A lista de mortos (ids e
+    erros do Resend, que podem trazer endereços) não sai na rota pública: EMAILS.estatisticas()"""
+    mid = query.get('id', [''])[0]
+    if not mid:
+        return {'estados': EMAILS.estatisticas(mortos=0)['estados']}
+    return EMAILS.status(mid) or {'erro': 'Email não encontrado', 'id': mid}
+
+# ─── streaming (SSE) ──────────────────────────────────────────────────────────
+
+def stream_gerar(dados):
+    """Envia cada campo do pacote assim que o JSON do modelo fecha o valor"""
+    yield 'campo', {'campo': 'vagas', 'valor': montar_vagas(dados.get('cidade','Manaus, AM'), dados.get('areas','Administrativo'))}
+    enviados = set()
+    parser   = ParserCamposJSON()
     try:
-        with urllib.request.urlopen(req, timeout=15) as r:
-            resp = json.loads(r.read().decode())
-            return {'ok': True, 'id': resp.get('id','')}
-    except urllib.error.HTTPError as e:
-        erro = e.read().decode()
-        return {'erro': f'Resend error: {erro}'}
+        sistema, prompt = prompt_gerar(dados)
+        for pedaco in chamar_ia_stream(prompt, sistema=sistema, rota='/api/gerar', ajustes=dados.get('ia')):
+            for campo, valor in parser.alimentar(pedaco):
+                if campo in CAMPOS_GERAR and campo not in enviados:
+                    enviados.add(campo)
+                    yield 'campo', {'campo': campo, 'valor': valor}
+        faltando = [c for c in CAMPOS_GERAR if c not in enviados]
+        if faltando and enviados:
+            # stream cortado (max_tokens) ou campo esquecido: pede só o que faltou
+            METRICAS.contar('json_reparado', '/api/gerar', 'complemento')
+            for campo, valor in completar_campos('/api/gerar', faltando, prompt, sistema, dados.get('ia')).items():
+                if campo_valido('/api/gerar', campo, valor):
+                    enviados.add(campo)
+                    yield 'campo', {'campo': campo, 'valor': valor}
+    except Exception as ex:
+        print(f'[/api/gerar] IA falhou no stream: {ex} — completando com fallback')
+        METRICAS.contar('fallbacks', '/api/gerar', 'stream')
+    faltando = [c for c in CAMPOS_GERAR if c not in enviados]
+    if faltando:
+        fb = fallback_gerar(dados)
+        for campo in faltando:
+            yield 'campo', {'campo': campo, 'valor': fb[campo]}
+    yield 'fim', {}
+
+def stream_chat(dados):
+    """Envia os tokens da pergunta conforme chegam; o evento 'fim' traz a pergunta final"""
+    partes = []
+    try:
+        sess = sessao_da_requisicao(dados)
+        sistema, prompt = prompt_chat(dados, sess)
+        for pedaco in chamar_ia_stream(prompt, sistema=sistema, rota='/api/chat', ajustes=dados.get('ia')):
+            partes.append(pedaco)
+            yield 'token', {'t': pedaco}
+        yield 'fim', resposta_chat(''.join(partes).strip(), sess)
+    except Exception as ex:
+        print(f'[/api/chat] IA falhou no stream: {ex} — usando fallback')
+        METRICAS.contar('fallbacks', '/api/chat', 'stream')
+        yield 'fim', fallback_chat(dados)
 
 # ─── HTTP handler ─────────────────────────────────────────────────────────────
 
@@ -415,24 +2190,65 @@ ROTAS = {
     '/api/chat':     (rota_chat,     fallback_chat),
     '/api/feedback': (rota_feedback, fallback_feedback),
     '/api/chance':   (rota_chance,   fallback_chance),
+    '/api/chance/lote': (rota_chance_lote, fallback_chance_lote),
     '/api/email':    (rota_email,    lambda d: {'erro': 'Serviço de email indisponível'}),
 }
 
+ROTAS_GET = {
+    '/api/cache': lambda query: dict(CACHE.estatisticas(), chamadas_compartilhadas=VOO.compartilhadas,
+                                     vagas=estatisticas_vagas()),
+    '/api/uso':   lambda query: estatisticas_uso(),
+    '/api/roteamento': lambda query: estatisticas_roteamento(),
+    '/api/email/status': status_email,
+    '/api/metrics': metricas,
+}
+
+# rotas que aceitam Accept: text/event-stream (ou ?stream=1)
+ROTAS_STREAM = {
+    '/api/gerar': stream_gerar,
+    '/api/chat':  stream_chat,
+}
+
 class handler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         self.send_response(200); self._cors(); self.end_headers()
 
+    def do_GET(self):
+        rota, _, query = self.path.partition('?')
+        if rota not in ROTAS_GET:
+            self._json(404, {'erro': 'Rota não encontrada'}); return
+        resultado = ROTAS_GET[rota](urllib.parse.parse_qs(query, keep_blank_values=True))
+        if isinstance(resultado, str):
+            self._enviar(200, resultado.encode(), 'text/plain; version=0.0.4; charset=utf-8'); return
+        self._json(200, resultado)
+
     def do_POST(self):
-        rota = self.path.split('?')[0]
+        rota, _, query = self.path.partition('?')
         if rota not in ROTAS:
             self._json(404, {'erro': 'Rota não encontrada'}); return
+        self._perfil = None
+        with METRICAS.requisicao(rota):
+            if METRICAS.perfilar(self.headers.get('X-Perfil')):
+                with METRICAS.perfil(rota) as self._perfil:
+                    self._post(rota, query)
+            else:
+                self._post(rota, query)
+
+    def _post(self, rota, query):
         fn_ia, fn_fb = ROTAS[rota]
-        length = int(self.headers.get('Content-Length',0))
-        body   = json.loads(self.rfile.read(length)) if length else {}
+        with METRICAS.fase('parse'):
+            length = int(self.headers.get('Content-Length',0))
+            body   = json.loads(self.rfile.read(length)) if length else {}
+        if not isinstance(body.get('ia', {}), dict):
+            self._json(400, {'erro': "'ia' deve ser um objeto"}); return
+        if rota in ROTAS_STREAM and ('text/event-stream' in self.headers.get('Accept','')
+                                     or 'stream=1' in query.split('&')):
+            self._sse(ROTAS_STREAM[rota](body)); return
         try:
             resultado = fn_ia(body)
         except Exception as ex:
             print(f'[{rota}] IA falhou: {ex} — usando fallback')
+            METRICAS.contar('fallbacks', rota, 'resposta')
             try:
                 resultado = fn_fb(body)
             except Exception as ex2:
@@ -441,14 +2257,37 @@ class handler(BaseHTTPRequestHandler):
 
     def _cors(self):
         self.send_header('Access-Control-Allow-Origin','*')
-        self.send_header('Access-Control-Allow-Methods','POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers','Content-Type')
+        self.send_header('Access-Control-Allow-Methods','GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers','Content-Type, X-Perfil')
+        self.send_header('Access-Control-Expose-Headers','X-Perfil-Id')
 
     def _json(self, status, data):
-        payload = json.dumps(data, ensure_ascii=False).encode()
+        with METRICAS.fase('serializacao'):
+            corpo = json.dumps(data, ensure_ascii=False).encode()
+        self._enviar(status, corpo, 'application/json; charset=utf-8')
+
+    def _enviar(self, status, payload, tipo):
+        if METRICAS.rota_atual(): METRICAS.contar('requisicoes', rotulo=str(status))
         self.send_response(status); self._cors()
-        self.send_header('Content-Type','application/json; charset=utf-8')
+        if getattr(self, '_perfil', None): self.send_header('X-Perfil-Id', self._perfil['id'])
+        self.send_header('Content-Type', tipo)
         self.send_header('Content-Length', str(len(payload)))
         self.end_headers(); self.wfile.write(payload)
 
+    def _sse(self, eventos):
+        METRICAS.contar('requisicoes', rotulo='200')
+        self.send_response(200); self._cors()
+        self.send_header('Content-Type','text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control','no-cache')
+        self.send_header('X-Accel-Buffering','no')
+        self.end_headers()
+        try:
+            for evento, dados in eventos:
+                self.wfile.write(f'event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n'.encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # cliente fechou a aba; encerra o stream do modelo
+        finally:
+            eventos.close()
+
     def log_message(self, *a): pass
@@ -0,0 +1,159 @@
+"""
+Servidor local no lugar do /v1/messages da Anthropic, para carga e testes sem rede.
+
+Responde a cada rota do gerar.py no formato dela, reconhecida pelo bloco de sistema (texto
+puro para a pergunta do /api/chat, JSON só com os campos pedidos nas demais), com latência
+até o primeiro token + ritmo de tokens por segundo, streaming SSE quando o corpo pede
+stream e injeção de erros (status e fração configuráveis, com Retry-After).
+
+  python bench/anthropic_falso.py [--porta 8787] [--latencia 0.4] [--tokens-s 80] [--erro 0.05]
+  ANTHROPIC_BASE_URL=http://127.0.0.1:8787 ...
+"""
+import argparse, json, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GERAR = {
+    'cv_html': '<div class="cv-header-info"><div class="cv-name">CANDIDATO</div></div>'
+               '<div class="cv-sec"><div class="cv-sec-title">Resumo</div></div>'
+               '<div class="cv-body">Profissional dedicado em início de carreira.</div>',
+    'linkedin': {'titulo': 'Assistente Administrativo | Primeiro emprego',
+                 'sobre': 'Sou organizado e proativo.\n\nBusco minha primeira oportunidade.\n\nAprendo rápido.'},
+    'email_candidatura': 'Prezado(a) Recrutador(a),\n\nVenho manifestar meu interesse na vaga.\n\nAtenciosamente.',
+    'dicas_entrevista': ['Pesquise a empresa', 'Chegue cedo', 'Use exemplos reais', 'Pergunte sobre a equipe',
+                         'Agradeça no fim'],
+    'analise_contratacao': {'porcentagem': 68, 'nivel': 'Bom', 'pontos_fortes': ['a', 'b', 'c'],
+                            'pontos_melhorar': ['d', 'e'], 'resumo': 'Bom potencial.'},
+}
+CHANCE = {'porcentagem': 72, 'nivel': 'Compatível', 'sub': 'Boa aderência às habilidades pedidas.',
+          'pontos_fortes': ['Excel', 'Atendimento', 'Organização'], 'pontos_melhorar': ['Inglês', 'CRM', 'SQL']}
+FEEDBACK = {'nota': 8, 'nivel': 'Muito bom', 'resumo': 'Respostas claras.', 'fortes': ['a', 'b', 'c'],
+            'melhorar': ['d', 'e'], 'dica': 'Seja específico.'}
+PERGUNTA = 'Conte sobre uma situação em que você precisou organizar várias tarefas ao mesmo tempo.'
+
+class Config:
+    latencia   = 0.4      # s até o primeiro token
+    tokens_s   = 80.0     # ritmo de saída (0 = instantâneo)
+    erro       = 0.0      # fração de chamadas que falham
+    erro_status = 529
+    retry_after = None
+    truncar    = 0.0      # fração de respostas cortadas com stop_reason max_tokens
+
+def texto_resposta(corpo):
+    """Resposta no formato da rota, escolhida pelo que o bloco de sistema pede: seções do
+    /api/gerar (uma ou todas), lote (um item por 'VAGA n:' da mensagem), feedback, chance
+    ou, sem JSON no sistema, a pergunta do chat em texto. O complemento de campos
+    ('só com estes campos … : a, b') recebe só os campos listados."""
+    sistema = ''.join(b.get('text', '') for b in corpo.get('system') or [])
+    msg     = conteudo(corpo)
+    if 'JSON' not in sistema:
+        return PERGUNTA
+    if '"resultados"' in sistema:
+        vagas = len(re.findall(r'^VAGA \d+:', msg, re.M))
+        dados = {'resultados': [dict(CHANCE, vaga=i+1, porcentagem=80 - 7*i) for i in range(vagas)]}
+    elif any(f'"{c}"' in sistema for c in GERAR):
+        dados = {c: v for c, v in GERAR.items() if f'"{c}"' in sistema}
+    else:
+        dados = FEEDBACK if '"nota"' in sistema else CHANCE
+    pedidos = re.search(r'só com estes campos, no formato combinado: (.+)$', msg)
+    if pedidos:
+        dados = {c: v for c, v in dict(CHANCE, **FEEDBACK, **GERAR).items() if c in pedidos.group(1).split(', ')}
+    return '```json\n' + json.dumps(dados, ensure_ascii=False) + '\n```'
+
+def conteudo(corpo):
+    msg = corpo['messages'][-1]['content']
+    return msg if isinstance(msg, str) else ''.join(b.get('text', '') for b in msg)
+
+def tokens(txt):
+    return max(1, len(txt) // 4)
+
+class AnthropicFalso(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True      # cabeçalho e corpo saem em writes separados: sem isso, +40 ms no keep-alive
+    chamadas, lock   = 0, threading.Lock()
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        with self.lock:
+            AnthropicFalso.chamadas += 1
+        time.sleep(Config.latencia)
+        if random.random() < Config.erro:
+            extra = {'Retry-After': str(Config.retry_after)} if Config.retry_after else {}
+            return self._json(Config.erro_status, {'type': 'error', 'error': {'type': 'overloaded_error',
+                                                                              'message': 'Overloaded'}}, extra)
+        texto = texto_resposta(corpo)
+        parar = 'end_turn'
+        if random.random() < Config.truncar:
+            texto, parar = texto[:len(texto) // 2], 'max_tokens'
+        entrada = tokens(json.dumps(corpo.get('system', '')) + conteudo(corpo))
+        uso     = {'input_tokens': entrada, 'output_tokens': tokens(texto),
+                   'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+        if corpo.get('stream'):
+            return self._stream(texto, parar, uso)
+        if Config.tokens_s:
+            time.sleep(tokens(texto) / Config.tokens_s)
+        self._json(200, {'id': 'msg_falso', 'type': 'message', 'role': 'assistant', 'model': corpo.get('model'),
+                         'content': [{'type': 'text', 'text': texto}], 'stop_reason': parar, 'usage': uso})
+
+    def _stream(self, texto, parar, uso):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        def evento(nome, dados):
+            b = f'event: {nome}\ndata: {json.dumps(dados)}\n\n'.encode()
+            self.wfile.write(b'%x\r\n' % len(b) + b + b'\r\n')
+        evento('message_start', {'type': 'message_start', 'message': {'usage': dict(uso, output_tokens=1)}})
+        passo = 16                                      # ~4 tokens por delta
+        for i in range(0, len(texto), passo):
+            if Config.tokens_s: time.sleep(tokens(texto[i:i+passo]) / Config.tokens_s)
+            evento('content_block_delta', {'type': 'content_block_delta', 'index': 0,
+                                           'delta': {'type': 'text_delta', 'text': texto[i:i+passo]}})
+        evento('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': parar},
+                                 'usage': {'output_tokens': uso['output_tokens']}})
+        evento('message_stop', {'type': 'message_stop'})
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _json(self, status, dados, extra={}):
+        b = json.dumps(dados, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(b)))
+        for k, v in extra.items(): self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(b)
+
+    def log_message(self, *a): pass
+
+def subir(porta=0, **config):
+    """Sobe numa thread; devolve o servidor (URL em f'http://127.0.0.1:{srv.server_port}')"""
+    for k, v in config.items(): setattr(Config, k, v)
+    srv = ThreadingHTTPServer(('127.0.0.1', porta), AnthropicFalso)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def argumentos(ap):
+    ap.add_argument('--latencia', type=float, default=Config.latencia, help='s até o primeiro token')
+    ap.add_argument('--tokens-s', type=float, default=Config.tokens_s, help='tokens de saída por segundo (0 = sem ritmo)')
+    ap.add_argument('--erro', type=float, default=Config.erro, help='fração de chamadas com erro')
+    ap.add_argument('--erro-status', type=int, default=Config.erro_status)
+    ap.add_argument('--retry-after', type=float, default=None)
+    ap.add_argument('--truncar', type=float, default=Config.truncar, help='fração cortada em max_tokens')
+
+def config_de(args):
+    return {k: getattr(args, k) for k in ('latencia', 'tokens_s', 'erro', 'erro_status', 'retry_after', 'truncar')}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--porta', type=int, default=8787)
+    argumentos(ap)
+    args = ap.parse_args()
+    srv = subir(args.porta, **config_de(args))
+    print(f'ANTHROPIC_BASE_URL=http://127.0.0.1:{srv.server_port}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Carga no handler inteiro: serve gerar.handler num ThreadingHTTPServer, aponta o modelo para
+bench/anthropic_falso.py (e o Resend para o falso de bench/email_fila.py) e bate em todas
+as ROTAS com payloads realistas, em vários níveis de concorrência.
+
+Por nível: req/s, p50/p95/p99 (ms) e, por rota, a taxa de respostas inteiras servidas pelo
+fallback e quantos fallbacks parciais (seção do gerar paralelo, lote ou vaga do chance/lote)
+houve — lidos do GET /api/metrics, como faria o Prometheus.
+
+  python bench/carga.py [--niveis 1,4,16,32] [--segundos 5] [--latencia 0.4] [--erro 0.05]
+  python bench/carga.py --stream --saida bench/resultados/carga.json
+"""
+import argparse, http.client, itertools, json, os, re, sys, tempfile, threading, time
+from http.server import ThreadingHTTPServer
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+TMP  = tempfile.mkdtemp()
+os.environ.setdefault('ANTHROPIC_API_KEY', 'chave-falsa')
+os.environ['EMPREGAAI_SESSOES_DB'] = os.path.join(TMP, 'sessoes.db')
+sys.path.insert(0, AQUI)
+sys.path.insert(0, os.path.join(AQUI, '..', 'api'))
+import anthropic_falso, email_fila, gerar
+
+with open(os.path.join(AQUI, 'fixtures', 'chance.json'), encoding='utf-8') as f:
+    CHANCE = json.load(f)
+
+# ─── payloads ─────────────────────────────────────────────────────────────────
+
+AREAS   = ['💼 Administrativo', '💻 Tecnologia', '🛒 Vendas', '🏥 Saúde', '📦 Logística']
+CIDADES = ['Manaus, AM', 'São Paulo, SP', 'Recife, PE', 'Belém, PA', 'Curitiba, PR']
+
+def p_gerar(i):
+    return {'nome': f'Candidata {i}', 'email': f'c{i}@exemplo.com', 'telefone': '(92) 99999-0000',
+            'cidade': CIDADES[i % 5], 'areas': AREAS[i % 5], 'escolaridade': 'Ensino médio completo',
+            'habilidades': 'Excel, Word, Atendimento ao cliente', 'experiencias': f'Voluntariado na escola ({i})',
+            'objetivo': 'Primeiro emprego'}
+
+def p_chat(i):
+    """Alterna os três jeitos de o cliente falar com /api/chat: transcrição inteira (modo
+    antigo), abrindo sessão (sessao: null) e seguindo uma sessão com só a resposta nova"""
+    perguntas, respostas = ['Fale sobre você.', 'Por que esta vaga?'], [f'Sou a candidata {i}, organizada e pontual.']
+    contexto = {'modo': 'geral', 'area': AREAS[i % 5], 'descricao_vaga': ''}
+    if i % 3 == 0:
+        return dict(contexto, perguntas=perguntas, respostas=respostas)
+    if i % 3 == 1:
+        return dict(contexto, sessao=None, perguntas=perguntas, respostas=respostas)
+    # mesmo processo do handler: a sessão aberta aqui é a que ele encontra no SQLite
+    sess = gerar.SESSOES.criar(contexto, perguntas, respostas)
+    return {'sessao': sess['id'], 'resposta': 'Quero aprender e crescer com a equipe.'}
+
+def p_feedback(i):
+    return {'modo': 'geral', 'area': AREAS[i % 5],
+            'perguntas': ['Fale sobre você.', 'Por que esta vaga?', 'Um desafio que superou?'],
+            'respostas': [f'Sou a candidata {i}.', 'Gosto da área.', 'Organizei a feira da escola.']}
+
+def p_chance(i):
+    c = CHANCE[i % len(CHANCE)]
+    return {'perfil': c['perfil'] + f' ({i})', 'vaga': c['vaga']}
+
+def p_lote(i):
+    return {'perfil': CHANCE[i % len(CHANCE)]['perfil'] + f' ({i})',
+            'vagas': [c['vaga'] for c in CHANCE[:6]]}
+
+def p_email(i):
+    return {'email': f'c{i}@exemplo.com', 'nome': f'Candidata {i}', 'cv_html': '<div>cv</div>',
+            'linkedin': 'Sobre mim', 'email_candidatura': 'Prezados'}
+
+PAYLOADS = {'/api/gerar': p_gerar, '/api/chat': p_chat, '/api/feedback': p_feedback,
+            '/api/chance': p_chance, '/api/chance/lote': p_lote, '/api/email': p_email}
+
+# ─── execução ─────────────────────────────────────────────────────────────────
+
+def percentil(ms, p):
+    ms = sorted(ms)
+    return round(ms[min(len(ms) - 1, int(len(ms) * p))], 1) if ms else None
+
+PARCIAIS = ('secao', 'lote', 'vaga')
+
+def fallbacks(porta):
+    """{(rota, inteiro?): fallbacks} do /api/metrics"""
+    conn = http.client.HTTPConnection('127.0.0.1', porta, timeout=10)
+    conn.request('GET', '/api/metrics')
+    texto = conn.getresponse().read().decode()
+    conn.close()
+    total = {}
+    for rota, tipo, n in re.findall(r'^empregaai_fallbacks_total\{rota="([^"]+)",tipo="([^"]+)"\} (\d+)', texto, re.M):
+        chave = (rota, tipo not in PARCIAIS)
+        total[chave] = total.get(chave, 0) + int(n)
+    return total
+
+def nivel(porta, rotas, concorrencia, segundos, stream, contador):
+    amostras, lock = [], threading.Lock()
+    fim = time.perf_counter() + segundos
+
+    def trabalhador(k):
+        for rota in itertools.cycle(rotas[k % len(rotas):] + rotas[:k % len(rotas)]):
+            if time.perf_counter() >= fim:
+                return
+            corpo   = json.dumps(PAYLOADS[rota](next(contador)), ensure_ascii=False).encode()
+            headers = {'Content-Type': 'application/json'}
+            if stream and rota in gerar.ROTAS_STREAM:
+                headers['Accept'] = 'text/event-stream'
+            t0 = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', porta, timeout=120)
+                conn.request('POST', rota, corpo, headers)
+                resp = conn.getresponse()
+                resp.read()
+                status = resp.status
+                conn.close()
+            except OSError:
+                status = 0
+            with lock:
+                amostras.append((rota, (time.perf_counter() - t0) * 1000, status))
+
+    antes   = fallbacks(porta)
+    inicio  = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador, args=(k,)) for k in range(concorrencia)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    duracao = time.perf_counter() - inicio
+    depois  = fallbacks(porta)
+
+    def novos(rotas_sel, inteiro):
+        return sum(depois.get((r, inteiro), 0) - antes.get((r, inteiro), 0) for r in rotas_sel)
+
+    def resumo(sel, rotas_sel):
+        ms = [m for _, m, _ in sel]
+        return {'req': len(sel), 'req_s': round(len(sel) / duracao, 1), 'p50': percentil(ms, .5),
+                'p95': percentil(ms, .95), 'p99': percentil(ms, .99),
+                'erros': sum(1 for *_, s in sel if s != 200),
+                'fallback': round(novos(rotas_sel, True) / len(sel), 3) if sel else 0.0,
+                'fallbacks_parciais': novos(rotas_sel, False)}
+    por_rota = {r: resumo([a for a in amostras if a[0] == r], [r]) for r in rotas}
+    return dict(resumo(amostras, rotas), concorrencia=concorrencia, rotas=por_rota)
+
+def imprimir(res):
+    print(f"\nconcorrência {res['concorrencia']}: {res['req']} req · {res['req_s']} req/s · "
+          f"p50 {res['p50']} · p95 {res['p95']} · p99 {res['p99']} ms · fallback {res['fallback']:.1%}")
+    for rota, r in res['rotas'].items():
+        if r['req']:
+            print(f"  {rota:<18} {r['req']:>5} req {r['req_s']:>7} req/s  p50 {r['p50']:>8}  p95 {r['p95']:>8}  "
+                  f"p99 {r['p99']:>8} ms  fallback {r['fallback']:>6.1%}  parciais {r['fallbacks_parciais']:>3}  "
+                  f"erros {r['erros']}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--niveis', default='1,4,16,32', help='concorrências, separadas por vírgula')
+    ap.add_argument('--segundos', type=float, default=5, help='duração de cada nível')
+    ap.add_argument('--rotas', default=','.join(gerar.ROTAS), help='subconjunto de ROTAS')
+    ap.add_argument('--stream', action='store_true', help='gerar/chat por SSE')
+    ap.add_argument('--saida', help='grava os resultados em JSON')
+    anthropic_falso.argumentos(ap)
+    args = ap.parse_args()
+
+    falso = anthropic_falso.subir(**anthropic_falso.config_de(args))
+    os.environ['ANTHROPIC_BASE_URL'] = f'http://127.0.0.1:{falso.server_port}'
+    email_fila.subir_resend()
+    app = ThreadingHTTPServer(('127.0.0.1', 0), gerar.handler)
+    app.daemon_threads = True
+    threading.Thread(target=app.serve_forever, daemon=True).start()
+
+    rotas     = [r for r in args.rotas.split(',') if r in gerar.ROTAS]
+    contador  = itertools.count()
+    config    = dict(anthropic_falso.config_de(args), segundos=args.segundos, stream=args.stream)
+    print('modelo falso:', config)
+    resultados = []
+    for c in (int(n) for n in args.niveis.split(',')):
+        resultados.append(nivel(app.server_port, rotas, c, args.segundos, args.stream, contador))
+        imprimir(resultados[-1])
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump({'quando': time.strftime('%Y-%m-%dT%H:%M:%S'), 'config': config, 'niveis': resultados},
+                      f, ensure_ascii=False, indent=1)
+        print('\ngravado em', args.saida)
+
+if __name__ == '__main__':
+    main()
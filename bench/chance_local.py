@@ -0,0 +1,74 @@
+"""
+Pré-avaliação local de /api/chance contra o modelo, sobre bench/fixtures/chance.json.
+
+  python bench/chance_local.py                 # tempo por avaliação + notas locais
+  python bench/chance_local.py --modelo        # também chama rota_chance (precisa de ANTHROPIC_API_KEY)
+  python bench/chance_local.py --modelo --gravar   # guarda 'nota_modelo' nas fixtures
+
+Com notas do modelo (das fixtures ou da execução) mostra o erro médio absoluto e a
+correlação de postos (Spearman) entre as duas notas.
+"""
+import argparse, json, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+import gerar
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'chance.json')
+
+def postos(valores):
+    ordem = sorted(range(len(valores)), key=lambda i: valores[i])
+    r = [0.0] * len(valores)
+    i = 0
+    while i < len(ordem):
+        j = i
+        while j + 1 < len(ordem) and valores[ordem[j+1]] == valores[ordem[i]]: j += 1
+        for k in range(i, j + 1): r[ordem[k]] = (i + j) / 2
+        i = j + 1
+    return r
+
+def spearman(a, b):
+    ra, rb = postos(a), postos(b)
+    ma, mb = sum(ra) / len(ra), sum(rb) / len(rb)
+    cov = sum((x - ma) * (y - mb) for x, y in zip(ra, rb))
+    var = (sum((x - ma) ** 2 for x in ra) * sum((y - mb) ** 2 for y in rb)) ** .5
+    return cov / var if var else 0.0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--modelo', action='store_true', help='calcula a nota do modelo para cada fixture')
+    ap.add_argument('--gravar', action='store_true', help='salva as notas do modelo nas fixtures')
+    ap.add_argument('--repeticoes', type=int, default=2000)
+    args = ap.parse_args()
+
+    casos = json.load(open(FIXTURES, encoding='utf-8'))
+    t0 = time.perf_counter()
+    for _ in range(args.repeticoes):
+        for c in casos: gerar.pontuar_local(c['perfil'], c['vaga'])
+    us = (time.perf_counter() - t0) / (args.repeticoes * len(casos)) * 1e6
+    print(f'pontuar_local: {us:.1f} µs por avaliação ({len(casos)} fixtures × {args.repeticoes})\n')
+
+    for c in casos:
+        c['nota_local'] = gerar.pontuar_local(c['perfil'], c['vaga'])['porcentagem']
+        if args.modelo:
+            t0 = time.perf_counter()
+            c['nota_modelo'] = gerar.rota_chance({'perfil': c['perfil'], 'vaga': c['vaga'], 'modo': 'modelo'})['porcentagem']
+            c['ms_modelo']   = round((time.perf_counter() - t0) * 1000)
+
+    print(f"{'local':>6} {'modelo':>7}  vaga")
+    for c in casos:
+        print(f"{c['nota_local']:>6} {str(c.get('nota_modelo','-')):>7}  {c['vaga'][:60]}")
+
+    pares = [(c['nota_local'], c['nota_modelo']) for c in casos if 'nota_modelo' in c]
+    if pares:
+        local, modelo = zip(*pares)
+        mae = sum(abs(a - b) for a, b in pares) / len(pares)
+        print(f'\nerro médio absoluto: {mae:.1f} pontos · spearman: {spearman(local, modelo):.2f} · n={len(pares)}')
+        if args.modelo:
+            print(f"latência do modelo: {sum(c['ms_modelo'] for c in casos) / len(casos):.0f} ms por avaliação")
+
+    if args.gravar and args.modelo:
+        for c in casos: c.pop('nota_local', None); c.pop('ms_modelo', None)
+        json.dump(casos, open(FIXTURES, 'w', encoding='utf-8'), ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
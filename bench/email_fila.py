@@ -0,0 +1,142 @@
+"""
+Fila de emails contra um Resend falso local: enfileira, lotes no /emails/batch, novas
+tentativas (500/429 com Retry-After), separação do lote quando uma mensagem é recusada e
+lista de mortos. Também mede quanto /api/email segura a requisição antes × agora.
+
+  python bench/email_fila.py [--n 250] [--latencia 0.2]
+"""
+import argparse, json, os, sys, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DB = os.path.join(tempfile.mkdtemp(), 'emails.db')
+os.environ['EMPREGAAI_EMAILS_DB'] = DB
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+import gerar
+
+# ─── Resend falso ─────────────────────────────────────────────────────────────
+
+class ResendFalso(BaseHTTPRequestHandler):
+    """POST /emails e /emails/batch. Falhas injetadas por atributos de classe:
+    falhas = [status, ...] consumidos um por chamada; 'to' com 'invalido' → 422 no lote."""
+    latencia, falhas, retry_after = 0.0, [], None
+    chamadas, entregues, lock = [], [], threading.Lock()
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        time.sleep(self.latencia)
+        msgs  = corpo if self.path == '/emails/batch' else [corpo]
+        with self.lock:
+            self.chamadas.append((self.path, len(msgs), self.headers.get('Idempotency-Key')))
+            falha = self.falhas.pop(0) if self.falhas else None
+            if falha is None and any('invalido' in m['to'][0] for m in msgs):
+                falha = 422
+            if falha is None:
+                ids = [f'rs_{len(self.entregues) + i}' for i in range(len(msgs))]
+                self.entregues.extend(msgs)
+        if falha:
+            extra = {'Retry-After': str(self.retry_after)} if falha == 429 and self.retry_after else {}
+            return self._resp(falha, {'name': 'erro', 'message': f'falha {falha}'}, extra)
+        self._resp(200, {'data': [{'id': i} for i in ids]} if self.path == '/emails/batch' else {'id': ids[0]})
+
+    def _resp(self, status, dados, extra={}):
+        corpo = json.dumps(dados).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        for k, v in extra.items(): self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *a): pass
+
+def subir_resend():
+    srv = ThreadingHTTPServer(('127.0.0.1', 0), ResendFalso)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    os.environ['RESEND_BASE_URL'] = f'http://127.0.0.1:{srv.server_port}'
+    return srv
+
+# ─── cenários ─────────────────────────────────────────────────────────────────
+
+def pedido(i, para=None):
+    return {'email': para or f'cand{i}@exemplo.com', 'nome': f'Cand {i}', 'cv_html': '<div>cv</div>',
+            'linkedin': 'Sobre mim', 'email_candidatura': 'Prezados'}
+
+def esperar(ids, estados=('enviado', 'falhou'), prazo=30):
+    fim = time.time() + prazo
+    while time.time() < fim:
+        st = [gerar.EMAILS.status(i)['estado'] for i in ids]
+        if all(e in estados for e in st):
+            return st
+        time.sleep(0.05)
+    raise AssertionError(f'fila não drenou: {st}')
+
+def zerar(**kw):
+    ResendFalso.chamadas.clear(); ResendFalso.entregues.clear()
+    ResendFalso.falhas, ResendFalso.retry_after, ResendFalso.latencia = [], None, 0.0
+    for k, v in kw.items(): setattr(ResendFalso, k, v)
+
+def cenario_lotes(n):
+    zerar()
+    ids = [gerar.rota_email(pedido(i))['id'] for i in range(n)]
+    st  = esperar(ids)
+    assert st.count('enviado') == n, st
+    lotes = [k for p, k, _ in ResendFalso.chamadas]
+    assert max(lotes) <= gerar.FilaEmails.LOTE and sum(lotes) == n, lotes
+    return f'{n} emails em {len(lotes)} chamadas ao /emails/batch {lotes}'
+
+def cenario_transitorio():
+    zerar(falhas=[500, 429], retry_after=0.3)
+    ids = [gerar.rota_email(pedido(i))['id'] for i in range(5)]
+    st  = esperar(ids)
+    assert st == ['enviado'] * 5, st
+    assert {gerar.EMAILS.status(i)['tentativas'] for i in ids} == {3}
+    chaves = {c for _, _, c in ResendFalso.chamadas}
+    assert len(chaves) == 1, 'retentativa do mesmo lote deve repetir a Idempotency-Key'
+    return f'500 → 429 (Retry-After) → enviado, {len(ResendFalso.chamadas)} chamadas'
+
+def cenario_invalido():
+    zerar()
+    ids = [gerar.rota_email(pedido(i, 'invalido@x' if i == 2 else None))['id'] for i in range(4)]
+    st  = esperar(ids)
+    assert st == ['enviado', 'enviado', 'falhou', 'enviado'], st
+    assert 'HTTP 422' in gerar.EMAILS.status(ids[2])['erro']
+    return f'lote recusado separado em {len(ResendFalso.chamadas) - 1} envios; só o inválido morreu'
+
+def cenario_morto():
+    zerar(falhas=[503] * gerar.FilaEmails.MAX_TENTATIVAS)
+    mid = gerar.rota_email(pedido(0))['id']
+    st  = esperar([mid])
+    assert st == ['falhou'], st
+    assert mid in [m['id'] for m in gerar.EMAILS.estatisticas()['mortos']]
+    assert 'mortos' not in gerar.status_email({})
+    assert gerar.EMAILS.reenviar(mid) and esperar([mid]) == ['enviado']
+    return f'{gerar.FilaEmails.MAX_TENTATIVAS} × 503 → morto; reenviar → enviado'
+
+def tempo_requisicao(latencia, n=20):
+    """ms que /api/email segura o cliente: POST síncrono (antes) × enfileirar (agora)"""
+    zerar(latencia=latencia)
+    t0 = time.perf_counter()
+    for i in range(n):
+        gerar.post_json(gerar.url_base('resend') + '/emails', {'to': [f'c{i}@x'], 'html': ''}, {}, timeout=15)
+    antes = (time.perf_counter() - t0) / n * 1000
+    t0 = time.perf_counter()
+    ids = [gerar.rota_email(pedido(i))['id'] for i in range(n)]
+    agora = (time.perf_counter() - t0) / n * 1000
+    esperar(ids)
+    return antes, agora
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=250)
+    ap.add_argument('--latencia', type=float, default=0.2, help='latência do Resend falso (s)')
+    args = ap.parse_args()
+
+    subir_resend()
+    gerar.FilaEmails.BACKOFF_BASE = 0.05
+    for cenario in (lambda: cenario_lotes(args.n), cenario_transitorio, cenario_invalido, cenario_morto):
+        print('ok ·', cenario())
+    antes, agora = tempo_requisicao(args.latencia)
+    print(f'\n/api/email com Resend a {args.latencia*1000:.0f} ms: síncrono {antes:.1f} ms · fila {agora:.2f} ms')
+
+if __name__ == '__main__':
+    main()
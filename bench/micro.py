@@ -0,0 +1,76 @@
+"""
+Microbenchmarks dos caminhos quentes locais (sem rede), gravados em JSON para comparar
+execuções: slug, montar_vagas (com e sem memo), fallback_gerar, a limpeza/parse do JSON
+do modelo (ler_json_ia) e a pré-avaliação do chance.
+
+  python bench/micro.py                                    # grava bench/resultados/micro-<data>.json
+  python bench/micro.py --comparar bench/resultados/micro-antes.json
+"""
+import argparse, json, os, platform, sys, time, timeit
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(AQUI, '..', 'api'))
+import gerar
+
+DADOS = {'nome': 'Maria da Silva', 'email': 'maria@email.com', 'telefone': '(92) 99999-0000', 'cidade': 'Manaus, AM',
+         'areas': '💼 Administrativo', 'escolaridade': 'Ensino médio completo — 2024',
+         'habilidades': 'Excel, Word, Organização, Atendimento ao cliente',
+         'experiencias': 'Voluntária na biblioteca da escola (2023)', 'objetivo': 'Primeiro emprego'}
+
+RESPOSTA_IA = '```json\n' + json.dumps({
+    'cv_html': '<div class="cv-name">MARIA</div>' * 40,
+    'linkedin': {'titulo': 'Assistente Administrativa', 'sobre': 'Sou organizada. ' * 60},
+    'email_candidatura': 'Prezado(a), ' * 80, 'dicas_entrevista': ['dica detalhada'] * 5,
+    'analise_contratacao': {'porcentagem': 72, 'nivel': 'Bom', 'pontos_fortes': ['a', 'b', 'c'],
+                            'pontos_melhorar': ['d', 'e'], 'resumo': 'ok'}}, ensure_ascii=False) + '\n```'
+
+PERFIL = 'Ensino médio completo. Sei Excel e Word, sou organizada e já fiz atendimento telefônico.'
+VAGA   = 'Auxiliar Administrativo. Requisitos: Excel intermediário, pacote Office, organização de documentos.'
+
+def montar_vagas_frio():
+    gerar._vagas.cache_clear()
+    return gerar.montar_vagas('São Paulo, SP', '💻 Tecnologia')
+
+CASOS = {
+    'slug':                lambda: gerar.slug('São Paulo — Atendimento ao Cliente'),
+    'montar_vagas_frio':   montar_vagas_frio,
+    'montar_vagas_memo':   lambda: gerar.montar_vagas('Manaus, AM', '💼 Administrativo'),
+    'fallback_gerar':      lambda: gerar.fallback_gerar(DADOS),
+    'ler_json_ia':         lambda: gerar.ler_json_ia(RESPOSTA_IA),
+    'pontuar_local':       lambda: gerar.pontuar_local(PERFIL, VAGA),
+}
+
+def medir(fn, repeticoes):
+    """Melhor µs por chamada entre as repetições (o mínimo é o menos ruidoso)"""
+    t = timeit.Timer(fn)
+    n, _ = t.autorange()
+    return min(t.repeat(repeticoes, n)) / n * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--repeticoes', type=int, default=5)
+    ap.add_argument('--saida', default=os.path.join(AQUI, 'resultados', f"micro-{time.strftime('%Y%m%d-%H%M%S')}.json"))
+    ap.add_argument('--comparar', help='JSON de uma execução anterior')
+    args = ap.parse_args()
+
+    anterior = {}
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)['us_por_chamada']
+
+    resultado = {}
+    for nome, fn in CASOS.items():
+        resultado[nome] = round(medir(fn, args.repeticoes), 3)
+        linha = f'{nome:<20} {resultado[nome]:>10.2f} µs'
+        if nome in anterior:
+            linha += f'   antes {anterior[nome]:>10.2f} µs  ({anterior[nome] / resultado[nome]:.2f}×)'
+        print(linha)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump({'quando': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                   'maquina': platform.machine(), 'us_por_chamada': resultado}, f, ensure_ascii=False, indent=1)
+    print('\ngravado em', args.saida)
+
+if __name__ == '__main__':
+    main()
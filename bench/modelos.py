@@ -0,0 +1,131 @@
+"""
+Renders por segundo: f-strings de antes × ModeloHTML compilado (com escape), para o currículo do
+fallback_gerar e o HTML do email de rota_email.
+
+  python bench/modelos.py [--n 20000]
+"""
+import argparse, html, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+import gerar
+
+CV = dict(nome='MARIA DA SILVA', area='Administrativo', cidade='Manaus, AM', email='maria@email.com',
+          tel='(92) 99999-0000', obj='Crescer na área administrativa.', formacao='Ensino médio completo — 2024',
+          sobre='Pessoa dedicada e proativa.',
+          chips=''.join(f'<span class="cv-skill-tag">{h}</span>' for h in ('Excel', 'Word', 'Organização')),
+          exp_html='<div class="cv-bullet">• Voluntária na biblioteca da escola (2023)</div>')
+EMAIL = dict(nome='Maria', cv_html=gerar.MODELO_CV.texto(**CV),
+             linkedin='Administrativo | Buscando primeiro emprego\n\nOlá! Sou Maria...' * 3,
+             email_cand='Prezado(a) Recrutador(a),\n\nVenho manifestar interesse...' * 4)
+
+# ─── como era antes (sem escape dos campos) ───────────────────────────────────
+
+def cv_fstring(nome, area, cidade, email, tel, obj, formacao, sobre, chips, exp_html):
+    cv_html = f"""<div class="cv-header-info">
+  <div class="cv-name">{nome.upper()}</div>
+  <div class="cv-role">Profissional em Início de Carreira | {area}</div>
+  <div class="cv-contact-line">📍 {cidade} &nbsp;·&nbsp; ✉️ {email} &nbsp;·&nbsp; 📱 {tel}</div>
+</div>
+<div class="cv-divider"></div>
+<div class="cv-sec"><div class="cv-sec-title">Objetivo Profissional</div></div>
+<div class="cv-body">Busco minha primeira oportunidade em {area} para desenvolver habilidades e contribuir com resultados positivos. {obj} Tenho grande disposição para aprender, crescer e superar desafios com dedicação e comprometimento.</div>
+<div class="cv-sec"><div class="cv-sec-title">Formação Acadêmica</div></div>
+<div class="cv-body"><strong>{formacao}</strong></div>
+<div class="cv-sec"><div class="cv-sec-title">Competências e Habilidades</div></div>
+<div class="cv-skills-wrap">{chips}</div>
+<div class="cv-sec"><div class="cv-sec-title">Experiências Complementares</div></div>
+<div class="cv-body">{exp_html}</div>
+<div class="cv-sec"><div class="cv-sec-title">Sobre Mim</div></div>
+<div class="cv-body">{sobre} Comprometido com meu desenvolvimento profissional, com facilidade para trabalho em equipe, comunicação clara e boa capacidade de adaptação.</div>"""
+    return cv_html
+
+def email_fstring(nome, cv_html, linkedin, email_cand):
+    html_email = f"""<!DOCTYPE html>
+<html><head><meta charset="UTF-8">
+<style>
+  body{{font-family:'Helvetica Neue',Arial,sans-serif;background:#f5ede0;margin:0;padding:0;}}
+  .wrap{{max-width:640px;margin:0 auto;background:#fff;border-radius:16px;overflow:hidden;}}
+  .header{{background:#1a0f06;padding:32px 40px;text-align:center;}}
+  .logo{{font-size:22px;font-weight:900;color:#fff;letter-spacing:-0.5px;}}
+  .logo span{{color:#e8521a;}}
+  .badge{{display:inline-block;background:rgba(232,82,26,.15);border:1px solid rgba(232,82,26,.3);
+    border-radius:100px;padding:6px 16px;font-size:12px;font-weight:700;color:#f4a935;
+    margin-top:10px;letter-spacing:1px;text-transform:uppercase;}}
+  .body{{padding:36px 40px;}}
+  .greeting{{font-size:22px;font-weight:900;color:#1a0f06;margin-bottom:8px;}}
+  .intro{{font-size:15px;color:#6b5e4a;line-height:1.6;margin-bottom:28px;}}
+  .cv-box{{background:#fdf8f0;border:1px solid #e8dfd0;border-radius:12px;padding:28px;margin-bottom:24px;}}
+  .cv-box h2{{font-size:12px;font-weight:800;color:#e8521a;letter-spacing:1.5px;text-transform:uppercase;margin-bottom:16px;}}
+  .cv-name{{font-size:24px;font-weight:900;color:#1a0f06;margin-bottom:4px;}}
+  .cv-role{{font-size:13px;color:#9a8e7e;margin-bottom:12px;}}
+  .cv-sec-title{{font-size:9px;font-weight:800;letter-spacing:2.5px;text-transform:uppercase;
+    color:#e8521a;padding-bottom:4px;border-bottom:1px solid #ede8df;margin:14px 0 6px;}}
+  .cv-body{{font-size:13px;color:#3a3020;line-height:1.7;}}
+  .cv-bullet{{font-size:13px;color:#3a3020;padding:2px 0 2px 12px;text-indent:-12px;}}
+  .skill-tag{{display:inline-block;background:#ede8df;border:1px solid #d4cdc0;border-radius:100px;
+    padding:3px 10px;font-size:11px;font-weight:600;color:#4a3f2f;margin:2px;}}
+  .section-title{{font-size:12px;font-weight:800;color:#9a8e7e;letter-spacing:1px;text-transform:uppercase;margin-bottom:12px;}}
+  .extra-box{{background:#f5ede0;border-radius:12px;padding:20px;margin-bottom:16px;font-size:13px;color:#3a3020;line-height:1.7;white-space:pre-line;}}
+  .cta{{background:#e8521a;color:#fff;display:block;text-align:center;padding:16px;border-radius:12px;
+    font-size:16px;font-weight:800;text-decoration:none;margin:28px 0 8px;}}
+  .footer{{background:#1a0f06;padding:20px 40px;text-align:center;font-size:12px;color:rgba(255,255,255,.4);}}
+</style></head><body>
+<div class="wrap">
+  <div class="header">
+    <div class="logo">Emprega<span>AI</span></div>
+    <div class="badge">✦ Seu currículo está pronto</div>
+  </div>
+  <div class="body">
+    <div class="greeting">Parabéns, {nome}! 🎉</div>
+    <div class="intro">Seu currículo profissional foi gerado com sucesso. Aqui está tudo que você precisa para começar a aplicar para vagas hoje mesmo.</div>
+
+    <div class="cv-box">
+      <h2>📄 Seu Currículo</h2>
+      {cv_html}
+    </div>
+
+    <div class="section-title">🔗 Seu Perfil LinkedIn</div>
+    <div class="extra-box">{linkedin}</div>
+
+    <div class="section-title">📧 Email de Candidatura Pronto</div>
+    <div class="extra-box">{email_cand}</div>
+
+    <a href="https://empregaai-mu.vercel.app" class="cta">🚀 Acessar EmpregaAI Plus →</a>
+    <div style="font-size:12px;color:#9a8e7e;text-align:center;">Dúvidas? Responda este email que te ajudamos.</div>
+  </div>
+  <div class="footer">EmpregaAI © 2025 · Feito com ❤️ e IA para quem está começando</div>
+</div>
+</body></html>"""
+    return html_email
+
+CAMPOS_CV    = ('nome', 'area', 'cidade', 'email', 'tel', 'obj', 'formacao', 'sobre')
+CAMPOS_EMAIL = ('nome', 'linkedin', 'email_cand')
+
+def escapado(valores, campos):
+    return {k: html.escape(v, quote=False) if k in campos else v for k, v in valores.items()}
+
+def medir(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n): fn()
+    return n / (time.perf_counter() - t0)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=20000)
+    args = ap.parse_args()
+
+    casos = (
+        ('cv (f-string → str)',         lambda: cv_fstring(**CV)),
+        ('cv (f-string + html.escape)', lambda: cv_fstring(**escapado(CV, CAMPOS_CV))),
+        ('cv (ModeloHTML → str)',       lambda: gerar.MODELO_CV.texto(**CV)),
+        ('email (f-string → bytes)',    lambda: email_fstring(**EMAIL).encode('utf-8')),
+        ('email (f-string + html.escape)', lambda: email_fstring(**escapado(EMAIL, CAMPOS_EMAIL)).encode('utf-8')),
+        ('email (ModeloHTML → bytes)',  lambda: gerar.MODELO_EMAIL.texto(**EMAIL).encode('utf-8')),
+    )
+    for nome, fn in casos:
+        print(f'{nome:<32} {medir(fn, args.n):>12,.0f} renders/s')
+    print(f"\nbytes do email: f-string {len(email_fstring(**EMAIL).encode())} · "
+          f"compactado {len(gerar.MODELO_EMAIL.texto(**EMAIL).encode('utf-8'))}")
+
+if __name__ == '__main__':
+    main()
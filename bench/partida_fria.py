@@ -0,0 +1,128 @@
+"""
+Partida fria da função: quanto custa importar gerar.py (python -X importtime) e quanto leva,
+num processo novo, a primeira resposta de cada rota — a primeira requisição de uma instância
+nova da Vercel — e, para comparar, uma segunda requisição no mesmo processo.
+
+Cada medida é um subprocesso com PYTHONDONTWRITEBYTECODE=1 (sem __pycache__, como no
+deploy), bancos SQLite novos e o modelo em bench/anthropic_falso.py sem latência: o que
+sobra é o custo local. --pyc repete com bytecode em cache; --snapshot grava o snapshot
+de EMPREGAAI_SNAPSHOT e repete com ele.
+
+  python bench/partida_fria.py [--repeticoes 5] [--pyc] [--saida bench/resultados/partida.json]
+  python bench/partida_fria.py --snapshot api/snapshot.bin
+"""
+import argparse, json, os, re, shutil, statistics, subprocess, sys, tempfile, time
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+API  = os.path.join(AQUI, '..', 'api')
+sys.path.insert(0, AQUI)
+import anthropic_falso, carga, gerar
+
+# roda no subprocesso: argv = método, rota, corpo da 1ª, corpo da 2ª
+FILHO = """
+import json, sys, time
+t0 = time.perf_counter()
+import gerar
+t1 = time.perf_counter()
+import http.client, threading
+from http.server import ThreadingHTTPServer
+srv = ThreadingHTTPServer(('127.0.0.1', 0), gerar.handler)
+threading.Thread(target=srv.serve_forever, daemon=True).start()
+metodo, rota, *corpos = sys.argv[1:]
+ms = []
+for corpo in corpos:
+    conn = http.client.HTTPConnection('127.0.0.1', srv.server_port, timeout=30)
+    t = time.perf_counter()
+    conn.request(metodo, rota, corpo.encode() or None, {'Content-Type': 'application/json'})
+    resp = conn.getresponse()
+    resp.read()
+    ms.append(((time.perf_counter() - t) * 1000, resp.status))
+    conn.close()
+print(json.dumps({'importar': (t1 - t0) * 1000, 'primeira': ms[0][0], 'segunda': ms[1][0],
+                  'status': [s for _, s in ms]}))
+"""
+
+def copia_api():
+    """api/ numa pasta nova, sem __pycache__: cada configuração parte do zero (a stdlib mantém o seu)"""
+    pasta = os.path.join(tempfile.mkdtemp(), 'api')
+    shutil.copytree(API, pasta, ignore=shutil.ignore_patterns('__pycache__'))
+    return pasta
+
+def ambiente(base, **extra):
+    tmp = tempfile.mkdtemp()
+    return dict(base, EMPREGAAI_SESSOES_DB=os.path.join(tmp, 'sessoes.db'),
+                EMPREGAAI_EMAILS_DB=os.path.join(tmp, 'emails.db'), **extra)
+
+def importtime(env, pasta):
+    """(self, cumulativo, {import direto: cumulativo}) em ms para `import gerar`"""
+    err = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import gerar'], cwd=pasta, env=ambiente(env),
+                         capture_output=True, text=True, check=True).stderr
+    filhos = {}
+    for proprio, cumulativo, recuo, nome in re.findall(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$', err, re.M):
+        if len(recuo) == 2:
+            filhos[nome] = int(cumulativo) / 1000
+        elif not recuo:
+            if nome == 'gerar':
+                return int(proprio) / 1000, int(cumulativo) / 1000, filhos
+            filhos = {}
+    raise RuntimeError('gerar não apareceu no -X importtime:\n' + err[-2000:])
+
+def primeira_resposta(env, pasta, metodo, rota, corpos):
+    out = subprocess.run([sys.executable, '-c', FILHO, metodo, rota, *corpos], cwd=pasta, env=ambiente(env),
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+def mediana(valores):
+    return round(statistics.median(valores), 2)
+
+def medir(nome, env, pasta, rotas, repeticoes):
+    print(f'\n── {nome}')
+    imps = [importtime(env, pasta) for _ in range(repeticoes)]
+    filhos = {m: mediana([f.get(m, 0) for _, _, f in imps]) for m in imps[0][2]}
+    res = {'import_proprio': mediana([p for p, _, _ in imps]), 'import_total': mediana([c for _, c, _ in imps]),
+           'imports_diretos': dict(sorted(filhos.items(), key=lambda kv: -kv[1])), 'rotas': {}}
+    print(f"import gerar: {res['import_total']} ms (próprio {res['import_proprio']} ms) · maiores imports: "
+          + ', '.join(f'{m} {ms}' for m, ms in list(res['imports_diretos'].items())[:5]))
+    for metodo, rota, corpos in rotas:
+        amostras = [primeira_resposta(env, pasta, metodo, rota, corpos) for _ in range(repeticoes)]
+        r = {k: mediana([a[k] for a in amostras]) for k in ('importar', 'primeira', 'segunda')}
+        r['status'] = amostras[0]['status']
+        res['rotas'][f'{metodo} {rota}'] = r
+        print(f"  {metodo:<4} {rota:<18} importar {r['importar']:>7} · 1ª resposta {r['primeira']:>7} · "
+              f"2ª {r['segunda']:>6} ms  {r['status']}")
+    return res
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--repeticoes', type=int, default=5, help='subprocessos por medida (vale a mediana)')
+    ap.add_argument('--pyc', action='store_true', help='mede também com __pycache__ aquecido')
+    ap.add_argument('--snapshot', help='grava o snapshot neste caminho e mede também com ele')
+    ap.add_argument('--saida', help='grava os resultados em JSON')
+    args = ap.parse_args()
+
+    falso = anthropic_falso.subir(latencia=0, tokens_s=0)
+    base  = {k: v for k, v in os.environ.items() if not k.startswith(('EMPREGAAI_', 'PYTHONPYCACHEPREFIX'))}
+    base.update(PYTHONDONTWRITEBYTECODE='1', ANTHROPIC_API_KEY='chave-falsa',
+                ANTHROPIC_BASE_URL=f'http://127.0.0.1:{falso.server_port}', RESEND_BASE_URL='http://127.0.0.1:9')
+    rotas = [('POST', r, [json.dumps(carga.PAYLOADS[r](i), ensure_ascii=False) for i in (0, 1)]) for r in gerar.ROTAS]
+    rotas += [('GET', r, ['', '']) for r in gerar.ROTAS_GET]
+
+    configs = {'sem __pycache__': (base, copia_api())}
+    if args.pyc:
+        pyc = {k: v for k, v in base.items() if k != 'PYTHONDONTWRITEBYTECODE'}
+        configs['com __pycache__'] = (pyc, copia_api())
+        importtime(*configs['com __pycache__'])          # aquece o cache de bytecode
+    if args.snapshot:
+        print('snapshot:', gerar.gravar_snapshot(args.snapshot), '→', args.snapshot)
+        configs['sem __pycache__ + snapshot'] = (dict(base, EMPREGAAI_SNAPSHOT=os.path.abspath(args.snapshot)), copia_api())
+
+    resultados = {nome: medir(nome, env, pasta, rotas, args.repeticoes) for nome, (env, pasta) in configs.items()}
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump({'quando': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0],
+                       'repeticoes': args.repeticoes, 'configs': resultados}, f, ensure_ascii=False, indent=1)
+        print('\ngravado em', args.saida)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Microbenchmark de montar_vagas: implementação original (f-strings + 8 quote por chamada +
+limpar_area com str.replace por emoji) × registro de portais compilado, sem e com memo.
+
+  python bench/vagas.py [--n 20000]
+"""
+import argparse, os, sys, time, urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'api'))
+import gerar
+from gerar import hifenado
+
+ENTRADAS = [('Manaus, AM', '💼 Administrativo'), ('São Paulo, SP', '💻 Tecnologia'),
+            ('Belém, PA', 'Atendimento ao Cliente, Vendas'), ('Recife, PE', '🏥 Saúde'),
+            ('Porto Alegre, RS', '📦 Logística'), ('Fortaleza', '🎨 Design')]
+
+# ─── como era antes do registro de portais ────────────────────────────────────
+
+def limpar_area_original(area):
+    for e in ['💼','💻','📊','🎨','🛒','🤝','📦','🏥','📣','🔧']:
+        area = area.replace(e, '')
+    return area.split(',')[0].strip()
+
+def montar_vagas_original(cidade, area):
+    area_limpa  = limpar_area_original(area)
+    cidade_str  = cidade.split(',')[0].strip()
+    estado      = cidade.split(',')[1].strip() if ',' in cidade else 'AM'
+    a  = urllib.parse.quote(area_limpa)
+    c  = urllib.parse.quote(cidade_str)
+    e  = urllib.parse.quote(estado)
+    ah = urllib.parse.quote(hifenado(area_limpa))
+    ch = urllib.parse.quote(hifenado(cidade_str))
+    ci = urllib.parse.quote(cidade_str + ', ' + estado)
+    return [
+        {'cargo':f'Vagas de {area_limpa} — Indeed','empresa':'Múltiplas','cidade':cidade_str,
+         'link':f'https://br.indeed.com/q-{ah}-l-{ci}-vagas.html','fonte':'Indeed Brasil',
+         'descricao':'Maior buscador de vagas — resultado filtrado pela sua cidade'},
+        {'cargo':f'Vagas de {area_limpa} — LinkedIn','empresa':'Múltiplas','cidade':cidade_str,
+         'link':f'https://www.linkedin.com/jobs/search/?keywords={a}&location={c}%2C%20{e}%2C%20Brasil',
+         'fonte':'LinkedIn Vagas','descricao':'Vagas exclusivas que não aparecem em outros portais'},
+        {'cargo':f'Vagas de {area_limpa} — Catho','empresa':'Múltiplas','cidade':cidade_str,
+         'link':f'https://www.catho.com.br/vagas/?q={a}&l={c}%2C+{e}',
+         'fonte':'Catho','descricao':'Um dos maiores portais de emprego do Brasil'},
+        {'cargo':f'Vagas de {area_limpa} em {cidade_str} — InfoJobs','empresa':'Múltiplas','cidade':cidade_str,
+         'link':f'https://www.infojobs.com.br/empregos-em-{ch},-{urllib.parse.quote(estado.lower())}.aspx',
+         'fonte':'InfoJobs','descricao':'Busca direta por cidade — resultado da sua região'},
+        {'cargo':f'Vagas de {area_limpa} — Gupy','empresa':'Grandes empresas','cidade':cidade_str,
+         'link':f'https://portal.gupy.io/job-search/term={a}',
+         'fonte':'Gupy','descricao':'Ambev, iFood, Nubank e outras grandes empresas'},
+        {'cargo':f'Vagas de {area_limpa} — Empregos.com.br','empresa':'Múltiplas','cidade':cidade_str,
+         'link':f'https://www.empregos.com.br/vagas/{ch}/{ah}',
+         'fonte':'Empregos.com.br','descricao':'Forte em vagas locais e pequenas empresas'},
+        {'cargo':f'Vagas de {area_limpa} — Vagas.com','empresa':'Múltiplas','cidade':cidade_str,
+         'link':f'https://www.vagas.com.br/vagas-de-{ah}+em+{ch}',
+         'fonte':'Vagas.com','descricao':'Portal consolidado com vagas verificadas'},
+        {'cargo':f'Vagas de {area_limpa} — Curriculum.com.br','empresa':'Múltiplas','cidade':cidade_str,
+         'link':f'https://www.curriculum.com.br/vagas/?term={a}&cidade={c}&estado={e}',
+         'fonte':'Curriculum.com.br','descricao':'9 milhões de profissionais — forte no Norte/Nordeste'},
+    ]
+
+def sem_memo(cidade, area):
+    """Só a montagem compilada (as cópias por chamada existem por causa do memo e contam lá)"""
+    return gerar._vagas.__wrapped__(cidade, area)
+
+def medir(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(*ENTRADAS[i % len(ENTRADAS)])
+    return n / (time.perf_counter() - t0)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--n', type=int, default=20000)
+    args = ap.parse_args()
+
+    for cidade, area in ENTRADAS:
+        assert montar_vagas_original(cidade, area) == gerar.montar_vagas(cidade, area), (cidade, area)
+    texto = '💼 Administrativo, 💻 Tecnologia'
+    print(f"{'limpar_area (original)':<28} {medir(lambda *_: limpar_area_original(texto), args.n):>12,.0f} ops/s")
+    print(f"{'limpar_area (atual)':<28} {medir(lambda *_: gerar.limpar_area(texto), args.n):>12,.0f} ops/s")
+
+    gerar._vagas.cache_clear()
+    base = medir(montar_vagas_original, args.n)
+    for nome, fn in (('montar_vagas (original)', montar_vagas_original),
+                     ('montar_vagas (compilado)', sem_memo),
+                     ('montar_vagas (memo)', gerar.montar_vagas)):
+        ops = base if fn is montar_vagas_original else medir(fn, args.n)
+        print(f'{nome:<28} {ops:>12,.0f} ops/s   {ops / base:5.1f}×')
+    print(f'memo: {gerar.estatisticas_vagas()}')
+
+if __name__ == '__main__':
+    main()